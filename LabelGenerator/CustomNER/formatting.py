@@ -1,41 +1,48 @@
+import argparse
 import os
 import re
 import sys
-from collections import Counter
-
-import pandas as pd
-from tqdm import tqdm
-
-sys.path.append("..")
-from utils import data_utils
-
-# gather all label files
-label_filepaths = os.listdir("prompt_results")
-label_data = pd.DataFrame()
-for fp in label_filepaths:
-    label_data = pd.concat(
-        [label_data, data_utils.read_data(path=f"prompt_results/{fp}")], axis=0
-    ).reset_index(drop=True)
-
-# label_data = data_utils.read_data(
-#     path=str(data_utils.root_dir / "prompt_result-20230407.ndjson.gz")
-# )
-print(len(label_data["input"]))
-
-
-entity_types = [
-    "組織(ORGANIZATION)",
-    "公司(COMPANY)",
-    "股票(STOCK)",
-    "人物(PERSON)",
-    "國家(GPE)",
-    "地點(LOCATION)",
-    "產品(PRODUCT)",
-]
-# 分隔 OpenAI 輸出結果
-openai_output_splitter = ",|\n-|、"
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+if not __package__:
+    # 直接以 python formatting.py 執行時，讓 LabelGenerator 套件可被 import
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+from LabelGenerator.tasks.ner import ENTITY_TYPES
+from LabelGenerator.utils import data_utils
+from LabelGenerator.utils.export_utils import SPLITS, SplitWriter, split_bucket
+from LabelGenerator.utils.matcher_utils import EntityMatcher
+from LabelGenerator.utils.metrics_utils import Metrics
+from LabelGenerator.utils.parser_utils import PARSE_OK, PARSE_PARTIAL, EntityOutputParser
+from LabelGenerator.utils.stats_utils import LabelStats
+from LabelGenerator.utils.tag_utils import (
+    TAG_DTYPE,
+    TagShard,
+    TagVocab,
+    save_tag_shard,
+    spans_to_tag_ids,
+)
+from LabelGenerator.utils.text_utils import (
+    group_spans,
+    normalize_with_offsets,
+    project_spans,
+    source_span,
+)
+
+entity_types = ENTITY_TYPES
 # 清理文章內特殊符號
 special_chars = "\r|\n|\u3000|\t|\xa0|\xa07"
+# 去除頭尾空白、連續空白改為 "，"、特殊符號改為空白
+normalize_substitutions = [
+    (re.compile(r"^\s+|\s+$"), ""),
+    (re.compile(r"\s+"), "，"),
+    (re.compile(special_chars), " "),
+]
 # BIOES label
 bioes_label_table = {
     "組織(ORGANIZATION)": "ORG",
@@ -46,171 +53,352 @@ bioes_label_table = {
     "地點(LOCATION)": "LOC",
     "產品(PRODUCT)": "PROD",
 }
-
-
-def result_check(result_string):
-    for test_term in entity_types:
-        if test_term not in result_string:
-            return False
-    return True
-
-
-def chr_startswith_special_character(string: str):
-    special_characters = ["?", "*"]
-    for chr in special_characters:
-        if string.startswith(chr):
-            return True
-    return False
-
-
-def add2dicts(dict1: dict, dict2: dict) -> dict:
-    dict3 = {**dict1, **dict2}
-    for k, v in dict1.items():
-        if k in dict2:
-            dict3[k] += v
-    return dict3
-
-
-def count_label_stats(formatted_label_data: pd.DataFrame) -> dict:
-    label_stats = {}
-    for _l in formatted_label_data["openai_label_bioes"]:
-        label_stats = add2dicts(label_stats, dict(Counter(_l)))
-
-    print(label_stats)
-    return label_stats
-
-
-
-# OpenAI 字串轉陣列
-formatted_label_data = {"input_id": [], "input": [], "openai_label": []}
-for i in tqdm(range(len(label_data["openai_output"]))):
-    _result_string = label_data["openai_output"][i]
-    # 如果 key 值符合預期才繼續往下處理
-    if result_check(_result_string):
-        _formatted_label = {k: [] for k in entity_types}
-        for item in _result_string.split("\n\n"):
-            # 如果該類別缺少答案則跳過
-            if len(item.split(":")) == 2:
-                h, t = item.split(":")
-                if h.strip() in _formatted_label:
-                    _formatted_label.update(
-                        {
-                            h.strip(): [
-                                chr.strip()
-                                for chr in re.split(openai_output_splitter, t)
-                                if chr.strip() and chr.strip() not in ["無", "无"]
-                            ]
-                        }
-                    )
-
-        formatted_label_data["input_id"].append(label_data["input_id"][i])
-        formatted_label_data["input"].append(label_data["input"][i])
-        formatted_label_data["openai_label"].append(_formatted_label)
-
-
-# 清理文章內特殊符號、長度大於 510 則分多段
-formatted_label_data["input"] = [
-    "，".join(sent.split()) for sent in formatted_label_data["input"]
-]
-formatted_label_data["input"] = [
-    re.sub(special_chars, " ", sent) for sent in formatted_label_data["input"]
-]
-formatted_label_data = pd.DataFrame(formatted_label_data)
-formatted_label_data["input"] = formatted_label_data["input"].apply(
-    lambda x: data_utils.split_sentence(x, flag="zh", mode="paragraph")
-)
-formatted_label_data = formatted_label_data.explode(["input"]).reset_index(drop=True)
-formatted_label_data["input"] = formatted_label_data["input"].apply(
-    lambda x: x[1:] if x.startswith("，") else x
-)
-formatted_label_data = formatted_label_data[
-    formatted_label_data["input"].apply(lambda x: len(x)) < 512
-].reset_index(drop=True)
-
-# 陣列轉出現位置
-_collect_openai_label_offset = []
-for i in tqdm(range(len(formatted_label_data["openai_label"]))):
-    _input_text, _formatted_label = (
-        formatted_label_data["input"][i],
-        formatted_label_data["openai_label"][i],
+output_parser = EntityOutputParser(entity_types)
+tag_vocab = TagVocab(bioes_label_table.values())
+begin_tag_ids = {k: tag_vocab.tag_id("B", v) for k, v in bioes_label_table.items()}
+inside_tag_ids = {k: tag_vocab.tag_id("I", v) for k, v in bioes_label_table.items()}
+
+
+def split_input(text: str, limit: int = 510) -> Tuple[str, np.ndarray, List[Tuple[int, int]]]:
+    """清理文章內特殊符號、長度大於 510 則分多段
+
+    Returns:
+        tuple: (清理後文章, 對應原文位置的 offsets, 各段在清理後文章中的 (start, end))
+    """
+    normalized, offsets = normalize_with_offsets(text, normalize_substitutions)
+    chunks = []
+    for start, end in data_utils.split_sentence_spans(
+        normalized, flag="zh", mode="paragraph", limit=limit
+    ):
+        if normalized.startswith("，", start):
+            start += 1
+        if start < end and end - start < limit + 2:
+            chunks.append((start, end))
+    return normalized, offsets, chunks
+
+
+def to_bioes(input_text: str, label_offset: dict) -> np.ndarray:
+    """出現位置+文本轉 BIOES 標記 id (uint8)，需要字串時以 tag_vocab.decode 轉換"""
+    spans = [
+        (start, end, ent_type)
+        for ent_type, ent_offset_list in label_offset.items()
+        for start, end in ent_offset_list
+    ]
+    if not spans:
+        return np.zeros(len(input_text), dtype=TAG_DTYPE)
+    starts, ends, ent_types = zip(*spans)
+    return spans_to_tag_ids(
+        length=len(input_text),
+        starts=starts,
+        ends=ends,
+        begin_ids=[begin_tag_ids[t] for t in ent_types],
+        inside_ids=[inside_tag_ids[t] for t in ent_types],
     )
-    _formatted_label_offset = {}
-    for ent_type, ent_list in _formatted_label.items():
-        if ent_list:
-            try:
-                _ent_list = [
-                    f"\{chr}" if chr_startswith_special_character(chr) else chr
-                    for chr in ent_list
-                ]
-                _ent_offsets = [
-                    item.span()
-                    for item in re.finditer("|".join(_ent_list), _input_text)
-                ]
-            except Exception as err:
-                print(type(_ent_list), _ent_list)
-                print(_input_text)
-                raise {err}
-
-            if _ent_offsets:
-                _formatted_label_offset[ent_type] = _ent_offsets
-
-    _collect_openai_label_offset.append(_formatted_label_offset)
-
-formatted_label_data["openai_label_offset"] = _collect_openai_label_offset
-
-
-# 出現位置+文本轉 BIOES
-_collect_openai_label_bioes = []
-for i in tqdm(range(len(formatted_label_data["openai_label"]))):
-    _input_text, _label_offset = (
-        formatted_label_data["input"][i],
-        formatted_label_data["openai_label_offset"][i],
-    )
-    bioes_tags = ["O"] * len(_input_text)
-    for ent_type, ent_offset_list in _label_offset.items():
-        ent_bio = bioes_label_table[ent_type]
-        for ent_offset in ent_offset_list:
-            bioes_tags[ent_offset[0]] = f"B-{ent_bio}"
-            bioes_tags[ent_offset[0] + 1 : ent_offset[1]] = [f"I-{ent_bio}"] * len(
-                bioes_tags[ent_offset[0] + 1 : ent_offset[1]]
-            )
-    _collect_openai_label_bioes.append(bioes_tags)
-
-formatted_label_data["openai_label_bioes"] = _collect_openai_label_bioes
 
 
-# data_utils.save_data(formatted_label_data, "formatting_result.ndjson.gz")
-# print("Successfully saved formatting_result.ndjson.gz")
-
-
-# label stats
-label_stats = count_label_stats(formatted_label_data)
-data_utils.save_data(label_stats, path="formatting_result_stats.json")
+def format_record(record: dict, metrics: Metrics = None) -> Tuple[List[dict], str]:
+    """單筆 OpenAI 結果轉成一或多段 (長度 <= 510) 的標記資料
+
+    實體只在整篇清理後的文章上比對一次，再依位置投影到各段
+    近似重複文章的 record 帶有 canonical_id，原樣寫入每段，其他文章為 None
+    metrics: 指定時記錄 parse、split、match、tag 各階段耗時
+
+    Returns:
+        tuple: (標記資料, 解析結果的原因碼)
+    """
+    t0 = time.perf_counter()
+    _formatted_label, reason = output_parser.parse(record["openai_output"])
+    t1 = time.perf_counter()
+    if _formatted_label is None:
+        if metrics is not None:
+            metrics.observe("parse", t1 - t0)
+        return [], reason
+    normalized, offsets, chunks = split_input(record["input"])
+    t2 = time.perf_counter()
+    spans = EntityMatcher(_formatted_label).find(normalized)
+    t3 = time.perf_counter()
+    span_starts = np.fromiter((s[0] for s in spans), dtype=np.int64, count=len(spans))
+    span_ends = np.fromiter((s[1] for s in spans), dtype=np.int64, count=len(spans))
+    rows = []
+    for chunk_start, chunk_end in chunks:
+        lo, hi = project_spans(span_starts, span_ends, chunk_start, chunk_end)
+        _input_text = normalized[chunk_start:chunk_end]
+        _label_offset = group_spans(spans[lo:hi], shift=chunk_start)
+        rows.append(
+            {
+                "input_id": record["input_id"],
+                "canonical_id": record.get("canonical_id"),
+                "input": _input_text,
+                "input_source_span": source_span(offsets, chunk_start, chunk_end),
+                "openai_label": _formatted_label,
+                "openai_label_offset": _label_offset,
+                "openai_label_tags": to_bioes(_input_text, _label_offset),
+            }
+        )
+    if metrics is not None:
+        metrics.observe("parse", t1 - t0)
+        metrics.observe("split", t2 - t1)
+        metrics.observe("match", t3 - t2)
+        metrics.observe("tag", time.perf_counter() - t3)
+    return rows, reason
+
+
+def format_records(records: List[dict]) -> Tuple[List[dict], Counter, dict]:
+    """Returns: (標記資料, 各原因碼筆數, 各階段耗時的 metrics snapshot)"""
+    rows, parse_counts, metrics = [], Counter(), Metrics()
+    for record in records:
+        _rows, reason = format_record(record, metrics=metrics)
+        rows.extend(_rows)
+        parse_counts[reason] += 1
+    metrics.incr("records", len(records))
+    metrics.incr("chunks", len(rows))
+    for reason, count in parse_counts.items():
+        metrics.incr("parse_results", count, reason=reason)
+    return rows, parse_counts, metrics.snapshot()
+
+
+def shard_paths(directory: str) -> List[Path]:
+    """ShardedCheckpoint 寫出的 shard，略過中斷時殘留的 _tmp- 暫存檔"""
+    return sorted(
+        path
+        for path in Path(directory).glob("*-part-[0-9]*.ndjson.gz")
+        if not path.name.startswith("_tmp-")
+    )
 
 
-# split train/val/test
-# 排除沒有任何實體的樣本
-filtered_formatted_label_data = formatted_label_data[formatted_label_data["openai_label_offset"].apply(lambda x: True if x else False)].reset_index(drop=True)
-print(len(filtered_formatted_label_data))
-label_stats = count_label_stats(filtered_formatted_label_data)
-data_utils.save_data(label_stats, path="filtered_formatting_result_stats.json")
+def iter_label_records(
+    input_dir: str, chunk_size: int, dedup_dir: str = None
+) -> Iterator[List[dict]]:
+    """依序串流讀取 input_dir 下所有結果檔，每 chunk_size 筆為一組
+
+    dedup_dir 下記錄的近似重複文章沿用其標準版本的 openai_output 並保留 canonical_id，
+    放在最後輸出
+    """
+    dedup_paths = shard_paths(dedup_dir) if dedup_dir else []
+    # 只保留被引用到的標準版本輸出
+    canonical_ids = set()
+    for path in dedup_paths:
+        canonical_ids.update(
+            data_utils.read_data(path=str(path))["canonical_id"].astype(str)
+        )
+    canonical_outputs = {}
+
+    for path in shard_paths(input_dir):
+        for batch in data_utils.read_data_batches(
+            path=str(path),
+            batch_size=chunk_size,
+            columns=["input_id", "input", "openai_output"],
+        ):
+            if not len(batch):
+                continue
+            if canonical_ids:
+                for input_id, output in zip(
+                    batch["input_id"].astype(str), batch["openai_output"]
+                ):
+                    if input_id in canonical_ids:
+                        canonical_outputs[input_id] = output
+            yield batch.to_dict("records")
+
+    num_missing = 0
+    for path in dedup_paths:
+        for batch in data_utils.read_data_batches(
+            path=str(path),
+            batch_size=chunk_size,
+            columns=["input_id", "input", "canonical_id"],
+        ):
+            records = []
+            for record in batch.to_dict("records"):
+                record["canonical_id"] = str(record["canonical_id"])
+                output = canonical_outputs.get(record["canonical_id"])
+                if output is None:
+                    # 標準版本尚未標記 (例如花費上限中斷)
+                    num_missing += 1
+                    continue
+                records.append({**record, "openai_output": output})
+            if records:
+                yield records
+    if num_missing:
+        print(f"{num_missing} near-duplicates skipped: canonical not labeled yet")
+
+
+def imap_bounded(
+    executor: ProcessPoolExecutor,
+    fn: Callable,
+    iterable: Iterable,
+    max_pending: int,
+) -> Iterator:
+    """與 executor.map 相同且保持順序，但同時最多只送出 max_pending 個工作"""
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def run_formatting(
+    input_dir: str = "prompt_results",
+    output_dir: str = "formatting_results",
+    num_workers: int = os.cpu_count(),
+    chunk_size: int = 1000,
+    dedup_dir: str = "dedup_results",
+) -> dict:
+    """以 process pool 分組處理所有結果檔，每組處理完即寫出一個 shard
+
+    dedup_dir: runner 記錄的近似重複文章，沿用標準版本的標記
+
+    Returns:
+        dict: 全部資料與排除無實體樣本後的 label 統計，以及各原因碼的解析筆數
+    """
+    import pandas as pd
+    from tqdm import tqdm
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    # 清除上次執行留下的 shard，避免 shard 數不同時混用新舊結果
+    for old_path in Path(output_dir).glob("formatting_result-part-*"):
+        old_path.unlink()
+    label_stats, filtered_label_stats = LabelStats(tag_vocab), LabelStats(tag_vocab)
+    parse_counts, metrics = Counter(), Metrics()
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for i, (rows, _parse_counts, _metrics) in enumerate(
+            tqdm(
+                imap_bounded(
+                    executor,
+                    format_records,
+                    iter_label_records(input_dir, chunk_size, dedup_dir=dedup_dir),
+                    max_pending=num_workers * 2,
+                )
+            )
+        ):
+            parse_counts.update(_parse_counts)
+            metrics.merge(_metrics)
+            if not rows:
+                continue
+            formatted_label_data = pd.DataFrame(rows)
+            # 文字與實體位置存 ndjson.gz，標記 id 另存為可 memory-map 的 .npy
+            path_prefix = str(Path(output_dir) / f"formatting_result-part-{i:05d}")
+            with metrics.timer("write"):
+                data_utils.save_data(
+                    formatted_label_data.drop(columns=["openai_label_tags"]),
+                    path=f"{path_prefix}.ndjson.gz",
+                )
+                save_tag_shard(path_prefix, formatted_label_data["openai_label_tags"].tolist())
+
+            # 排除沒有任何實體的樣本
+            filtered_formatted_label_data = formatted_label_data[
+                formatted_label_data["openai_label_offset"].apply(bool)
+            ]
+            label_stats.update(formatted_label_data["openai_label_tags"].tolist())
+            filtered_label_stats.update(
+                filtered_formatted_label_data["openai_label_tags"].tolist()
+            )
 
-_train, _dev, _test = (
-    filtered_formatted_label_data.iloc[: len(filtered_formatted_label_data) // 10 * 7],
-    filtered_formatted_label_data.iloc[
-        len(filtered_formatted_label_data) // 10 * 7 : len(filtered_formatted_label_data) // 10 * 9
-    ].reset_index(drop=True),
-    filtered_formatted_label_data.iloc[len(filtered_formatted_label_data) // 10 * 9 :].reset_index(drop=True),
-)
-print(_train, _dev, _test)
-# for _d, folder_name in zip([_train, _dev, _test], ["train", "dev", "test"]):
-#     _output_dir = data_utils.root_dir / folder_name
-#     _output_dir.mkdir(exist_ok=True, parents=True)
-#     for i in range(len(_d)):
-#         assert len(_d["input"][i]) == len(_d["openai_label_bioes"][i])
-
-#     _input = [" ".join(_d["input"][i]) for i in range(len(_d))]
-#     _output = [" ".join(_d["openai_label_bioes"][i]) for i in range(len(_d))]
-
-#     data_utils.save_data(data=_input, path=str(_output_dir / "seq.in"))
-#     data_utils.save_data(data=_output, path=str(_output_dir / "seq.out"))
+    label_stats, filtered_label_stats = label_stats.to_dict(), filtered_label_stats.to_dict()
+    print(label_stats["num_docs"], filtered_label_stats["num_docs"])
+    print(label_stats["tag_counts"])
+    print(filtered_label_stats["tag_counts"])
+    data_utils.save_data(label_stats, path="formatting_result_stats.json")
+    data_utils.save_data(filtered_label_stats, path="filtered_formatting_result_stats.json")
+
+    # 已付費但無法解析而被捨棄的比例
+    num_rejected = sum(c for k, c in parse_counts.items() if k not in (PARSE_OK, PARSE_PARTIAL))
+    print(dict(parse_counts), f"rejected: {num_rejected / max(sum(parse_counts.values()), 1):.2%}")
+    data_utils.save_data(dict(parse_counts), path="formatting_parse_stats.json")
+    metrics.write_json("formatting_metrics.json")
+    metrics.write_prometheus("formatting_metrics.prom")
+    return {
+        "label_stats": label_stats,
+        "filtered_label_stats": filtered_label_stats,
+        "parse_counts": dict(parse_counts),
+    }
+
+
+def export_splits(
+    input_dir: str = "formatting_results",
+    export_dir: str = "training_data",
+    ratios: Tuple[float, float, float] = (0.7, 0.2, 0.1),
+    keep_empty: bool = False,
+    salt: str = "",
+) -> dict:
+    """串流讀取 run_formatting 的 shard，依 id 的雜湊寫入 train/dev/test
+
+    每個切分輸出 seq.in/seq.out 與可 memory-map 的 data.* (見 TokenShardWriter)，
+    切分只取決於 canonical_id (非近似重複的文章為 input_id)，重跑或新增資料後既有文章的切分不變，
+    近似重複的文章也與其標準版本落在同一切分，不會同時出現在 train 與 test
+
+    keep_empty: 保留沒有任何實體的樣本，預設排除
+
+    Returns:
+        dict: 各切分的筆數
+    """
+    writers = {
+        name: SplitWriter(str(Path(export_dir) / name), tag_vocab.id2tag) for name in SPLITS
+    }
+    for ndjson_path in sorted(Path(input_dir).glob("formatting_result-part-*.ndjson.gz")):
+        tag_shard = TagShard(str(ndjson_path)[: -len(".ndjson.gz")])
+        i = 0
+        for batch in data_utils.read_data_batches(
+            path=str(ndjson_path),
+            columns=["input_id", "canonical_id", "input", "openai_label_offset"],
+        ):
+            for input_id, canonical_id, text, label_offset in zip(
+                batch["input_id"].astype(str),
+                batch["canonical_id"],
+                batch["input"],
+                batch["openai_label_offset"],
+            ):
+                tags = tag_shard[i]
+                i += 1
+                if label_offset or keep_empty:
+                    # 舊版 shard 沒有 canonical_id 欄位，讀到的是 None
+                    key = str(canonical_id) if canonical_id else input_id
+                    writers[split_bucket(key, ratios, salt=salt)].write(input_id, text, tags)
+    for writer in writers.values():
+        writer.close()
+    split_counts = {name: len(writer) for name, writer in writers.items()}
+    print(split_counts)
+    data_utils.save_data(split_counts, path=str(Path(export_dir) / "split_stats.json"))
+    return split_counts
+
+
+def build_parser(prog: Optional[str] = None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=prog, description="OpenAI NER 結果轉 BIOES 標記資料")
+    parser.add_argument("--input_dir", default="prompt_results")
+    parser.add_argument("--output_dir", default="formatting_results")
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk_size", type=int, default=1000)
+    parser.add_argument("--dedup_dir", default="dedup_results")
+    parser.add_argument("--split", action="store_true", help="處理完後匯出 train/dev/test")
+    parser.add_argument(
+        "--export_only", action="store_true", help="只以既有的 output_dir 匯出 train/dev/test"
+    )
+    parser.add_argument("--export_dir", default="training_data")
+    parser.add_argument(
+        "--split_ratios", type=float, nargs=3, default=(0.7, 0.2, 0.1), help="train/dev/test 比例"
+    )
+    parser.add_argument("--keep_empty", action="store_true", help="匯出時保留沒有實體的樣本")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> None:
+    args = build_parser(prog).parse_args(argv)
+    if not args.export_only:
+        run_formatting(
+            input_dir=args.input_dir,
+            output_dir=args.output_dir,
+            num_workers=args.num_workers,
+            chunk_size=args.chunk_size,
+            dedup_dir=args.dedup_dir,
+        )
+    if args.split or args.export_only:
+        export_splits(
+            input_dir=args.output_dir,
+            export_dir=args.export_dir,
+            ratios=tuple(args.split_ratios),
+            keep_empty=args.keep_empty,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""以 OpenAI 產生 NLP 標記資料
+
+import LabelGenerator 不會載入 pandas、openai、tiktoken 等套件，下列名稱在第一次取用時
+才 import 對應模組。命令列入口: python -m LabelGenerator {label,format} ...
+"""
+import importlib
+
+_LAZY_ATTRS = {
+    "label_dates": "LabelGenerator.runner",
+    # tasks
+    "LabelTask": "LabelGenerator.tasks",
+    "NERTask": "LabelGenerator.tasks",
+    "ClassificationTask": "LabelGenerator.tasks",
+    "register_task": "LabelGenerator.tasks",
+    "get_task": "LabelGenerator.tasks",
+    # CustomNER
+    "run_formatting": "LabelGenerator.CustomNER.formatting",
+    "export_splits": "LabelGenerator.CustomNER.formatting",
+    # utils
+    "AsyncLabelingEngine": "LabelGenerator.utils.async_utils",
+    "RateLimiter": "LabelGenerator.utils.async_utils",
+    "TokenBudget": "LabelGenerator.utils.budget_utils",
+    "plan_run": "LabelGenerator.utils.budget_utils",
+    "ResponseCache": "LabelGenerator.utils.cache_utils",
+    "log_setting": "LabelGenerator.utils.data_utils",
+    "split_sentence": "LabelGenerator.utils.data_utils",
+    "NearDuplicateIndex": "LabelGenerator.utils.dedup_utils",
+    "TokenShard": "LabelGenerator.utils.export_utils",
+    "split_bucket": "LabelGenerator.utils.export_utils",
+    "JobState": "LabelGenerator.utils.job_utils",
+    "EntityMatcher": "LabelGenerator.utils.matcher_utils",
+    "Metrics": "LabelGenerator.utils.metrics_utils",
+    "OpenAIAPIWrapper": "LabelGenerator.utils.openai_utils",
+    "EntityOutputParser": "LabelGenerator.utils.parser_utils",
+    "SamplingIndex": "LabelGenerator.utils.sampling_utils",
+    "select_diverse": "LabelGenerator.utils.sampling_utils",
+    "EmbeddingStore": "LabelGenerator.utils.vector_utils",
+}
+
+__all__ = sorted(_LAZY_ATTRS)
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
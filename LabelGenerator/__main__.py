@@ -0,0 +1,3 @@
+from LabelGenerator.cli import main
+
+main()
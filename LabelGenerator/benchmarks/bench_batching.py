@@ -0,0 +1,90 @@
+"""比較一次一篇與多篇打包送出的 articles/sec 與每篇 token 數 (使用本地假 server)
+
+執行: cd benchmarks && python bench_batching.py
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+# 以 cd benchmarks && python ... 執行，讓 LabelGenerator 套件可被 import
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from LabelGenerator.benchmarks.synthetic import FakeChatServer, generate_articles
+from LabelGenerator.tasks.ner import NER
+from LabelGenerator.utils.async_utils import AsyncLabelingEngine
+from LabelGenerator.utils.openai_utils import OpenAIAPIWrapper
+
+
+def _engine(api: OpenAIAPIWrapper, concurrency: int) -> AsyncLabelingEngine:
+    return AsyncLabelingEngine(
+        api=api,
+        concurrency=concurrency,
+        generation_params={"temperature": 0},
+        # 假 server 不限速，避免 rate limiter 成為瓶頸
+        requests_per_minute=10**9,
+        tokens_per_minute=10**12,
+    )
+
+
+def bench_batching(
+    articles: list,
+    port: int = 8767,
+    latency: float = 0.2,
+    concurrency: int = 20,
+    max_batch_tokens: int = 3000,
+) -> Dict[str, float]:
+    """同一批文章分別一次一篇與打包送出，不使用快取
+
+    Returns:
+        dict: 打包模式的 items/seconds/requests/tokens_per_article，以及一次一篇的對照數字
+    """
+    contents = [a["content"][:1500] for a in articles]
+    with FakeChatServer(port=port, latency=latency) as server:
+        api = OpenAIAPIWrapper(API_KEY="fake", api_base=server.api_base)
+
+        engine = _engine(api, concurrency)
+        start = time.perf_counter()
+        engine.label([NER.build_messages([content]) for content in contents])
+        single_seconds = time.perf_counter() - start
+        single = {
+            "seconds": single_seconds,
+            "requests": engine.num_requests,
+            "tokens_per_article": engine.num_tokens / max(len(contents), 1),
+        }
+
+        engine = _engine(api, concurrency)
+        start = time.perf_counter()
+        engine.label_packed(
+            contents, build_messages=NER.build_messages, max_batch_tokens=max_batch_tokens
+        )
+        seconds = time.perf_counter() - start
+    return {
+        "items": len(contents),
+        "seconds": seconds,
+        "requests": engine.num_requests,
+        "tokens_per_article": engine.num_tokens / max(len(contents), 1),
+        "one_per_call": single,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--num_articles", type=int, default=500)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    result = bench_batching(
+        generate_articles(args.num_articles),
+        port=args.port,
+        latency=args.latency,
+        concurrency=args.concurrency,
+    )
+    for name, r in [("one-per-call", result["one_per_call"]), ("packed", result)]:
+        print(
+            f"{name:<16} {result['items'] / r['seconds']:8.1f} articles/s  "
+            f"{r['tokens_per_article']:8.1f} tokens/article  "
+            f"{r['requests']} requests"
+        )
@@ -0,0 +1,144 @@
+"""比較 split_sentence_spans 與原本兩次 re.sub + splitlines 的分句速度
+
+執行: cd benchmarks && python bench_split_sentence.py
+"""
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+# 以 cd benchmarks && python ... 執行，讓 LabelGenerator 套件可被 import
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from LabelGenerator.utils.data_utils import split_sentence, split_sentence_spans_batch
+
+CHARS = "台積電鴻海聯發科今日股價上漲美國日本市場投資人預期營收成長晶片需求"
+PUNCTUATIONS = ["。", "，", "？", "！", "…", "。」", "！”"]
+
+
+def legacy_split_sentence(
+    document: str, flag: str = "all", mode: str = "sentence", limit: int = 510
+) -> List[str]:
+    """原本 data_utils.split_sentence 的實作 (兩次 re.sub 插入換行再 splitlines)
+
+    Args:
+        document (str): 要進行分句的文字段落
+        flag (:obj:`str`, optional): {"all", "zh", "en"}. "all": 中英文標點分句, "zh": 中文標點分句, "en": 英文標點分句   # noqa E501
+        limit (:obj:`int`, optional): 預設單句最大長度為 510 個字符，可以透過這個此參數增減
+
+    Returns:
+        list: 分句後的結果列表
+
+    """
+    result_list = []
+    try:
+        if flag == "zh":
+            document = re.sub(
+                "(?P<quotation_mark>([。？！…](?![”’\"'])))",
+                r"\g<quotation_mark>\n",
+                document,
+            )  # 單字符斷句號
+            document = re.sub(
+                "(?P<quotation_mark>([。？！]|…{1,2})[”’\"'])",
+                r"\g<quotation_mark>\n",
+                document,
+            )  # 特殊引號
+        elif flag == "en":
+            document = re.sub(
+                "(?P<quotation_mark>([.?!](?![”’\"'])))",
+                r"\g<quotation_mark>\n",
+                document,
+            )  # 英文單字符斷句號
+            document = re.sub(
+                "(?P<quotation_mark>([?!.][\"']))", r"\g<quotation_mark>\n", document
+            )  # 特殊引號
+        else:
+            document = re.sub(
+                "(?P<quotation_mark>([。？！….?!](?![”’\"'])))",
+                r"\g<quotation_mark>\n",
+                document,
+            )  # 單字符斷句號
+            document = re.sub(
+                "(?P<quotation_mark>(([。？！.!?]|…{1,2})[”’\"']))",
+                r"\g<quotation_mark>\n",
+                document,
+            )  # 特殊引號
+
+        if mode == "sentence":
+            sent_list_ori = document.splitlines()
+            for sent in sent_list_ori:
+                sent = sent.strip()
+                if not sent:
+                    continue
+                else:
+                    while len(sent) > limit:
+                        temp = sent[0:limit]
+                        result_list.append(temp)
+                        sent = sent[limit:]
+                    result_list.append(sent)
+
+        elif mode == "paragraph":
+            sent_list_ori = document.splitlines()[::-1]
+            while sent_list_ori:
+                paragraph = sent_list_ori.pop().strip()
+                len_sent = len(sent_list_ori)
+                while sent_list_ori and len(paragraph + sent_list_ori[-1]) < limit:
+                    paragraph += sent_list_ori.pop().strip()
+                    if len(sent_list_ori) == len_sent:
+                        print(sent_list_ori)
+                        raise Exception("not reducing")
+                    else:
+                        len_sent = len(sent_list_ori)
+                result_list.append(paragraph)
+
+    except Exception as e:
+        print(f"Error: {e}")
+        result_list.clear()
+        result_list.append(document)
+
+    return result_list
+
+
+def make_document(rng: random.Random, length: int = 1500) -> str:
+    pieces, size = [], 0
+    while size < length:
+        piece = "".join(rng.choices(CHARS, k=rng.randint(5, 40))) + rng.choice(PUNCTUATIONS)
+        pieces.append(piece)
+        size += len(piece)
+    return "".join(pieces)
+
+
+def bench(name: str, fn, documents) -> float:
+    start = time.perf_counter()
+    fn(documents)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed:8.3f}s  {len(documents) / elapsed:10.0f} docs/s")
+    return elapsed
+
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    documents = [make_document(rng) for _ in range(5000)]
+
+    for mode in ["sentence", "paragraph"]:
+        print(f"mode={mode}")
+        bench(
+            "legacy split_sentence",
+            lambda docs: [legacy_split_sentence(d, flag="zh", mode=mode) for d in docs],
+            documents,
+        )
+        bench(
+            "split_sentence",
+            lambda docs: [split_sentence(d, flag="zh", mode=mode) for d in docs],
+            documents,
+        )
+        bench(
+            "split_sentence_spans_batch",
+            lambda docs: split_sentence_spans_batch(docs, flag="zh", mode=mode),
+            documents,
+        )
+        assert all(
+            legacy_split_sentence(d, flag="zh", mode=mode) == split_sentence(d, flag="zh", mode=mode)
+            for d in documents[:200]
+        )
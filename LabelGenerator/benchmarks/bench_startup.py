@@ -0,0 +1,74 @@
+"""量測各入口的 import 時間與載入的重量級套件，每次在新的 process 中 import
+
+執行: cd benchmarks && python bench_startup.py
+"""
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+TARGETS = [
+    "LabelGenerator",
+    "LabelGenerator.cli",
+    "LabelGenerator.runner",
+    "LabelGenerator.CustomNER.prompt",
+    "LabelGenerator.CustomNER.formatting",
+]
+# 入口 import 時不應載入的套件
+HEAVY_MODULES = ["pandas", "openai", "tiktoken", "yaml", "tqdm", "fsspec", "aiohttp"]
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {target}
+seconds = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": seconds, "heavy": heavy}}))
+"""
+
+
+def measure_import(target: str, repeat: int = 5) -> Dict[str, object]:
+    """import 時間取 repeat 次中最短者，process 啟動時間另計"""
+    best, heavy = float("inf"), []
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, "-c", _IMPORT_SCRIPT.format(target=target, heavy=HEAVY_MODULES)],
+            cwd=REPO_ROOT,
+            text=True,
+        )
+        result = json.loads(output)
+        best, heavy = min(best, result["seconds"]), result["heavy"]
+    return {"seconds": best, "heavy": heavy}
+
+
+def measure_command(args: list, repeat: int = 5) -> float:
+    """整個命令 (含直譯器啟動) 的最短執行時間"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args], cwd=REPO_ROOT, check=True, capture_output=True
+        )
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_startup(repeat: int = 5) -> Dict[str, Dict[str, object]]:
+    results = {target: measure_import(target, repeat) for target in TARGETS}
+    results["python -m LabelGenerator --help"] = {
+        "seconds": measure_command(["-m", "LabelGenerator", "--help"], repeat),
+        "heavy": [],
+    }
+    results["python -c pass"] = {
+        "seconds": measure_command(["-c", "pass"], repeat),
+        "heavy": [],
+    }
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in bench_startup().items():
+        heavy = ", ".join(result["heavy"])
+        print(f"{name:<40} {result['seconds'] * 1000:8.1f} ms  {heavy}")
@@ -0,0 +1,234 @@
+"""以合成新聞與假 OpenAI server 量測各階段吞吐量，結果存成 json 供跨 commit 比較
+
+執行:
+    cd benchmarks && python run_benchmarks.py
+    python run_benchmarks.py --only split parse --compare results/<commit>.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+# 以 cd benchmarks && python ... 執行，讓 LabelGenerator 套件可被 import
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from LabelGenerator.benchmarks.bench_batching import bench_batching
+from LabelGenerator.benchmarks.bench_startup import TARGETS, measure_import
+from LabelGenerator.benchmarks.synthetic import (
+    ENTITY_TYPES,
+    FakeChatServer,
+    format_ner_output,
+    generate_articles,
+)
+from LabelGenerator.CustomNER import formatting
+from LabelGenerator.tasks.ner import NER
+from LabelGenerator.utils.async_utils import AsyncLabelingEngine
+from LabelGenerator.utils.data_utils import split_sentence_spans_batch
+from LabelGenerator.utils.matcher_utils import EntityMatcher
+from LabelGenerator.utils.openai_utils import OpenAIAPIWrapper
+from LabelGenerator.utils.parser_utils import EntityOutputParser
+
+RESULTS_DIR = Path(__file__).parent / "results"
+BENCHMARKS = ["split", "parse", "offsets", "bioes", "format", "e2e", "batching", "startup"]
+
+
+def timeit(fn: Callable[[], object], repeat: int) -> float:
+    """重複 repeat 次取最短時間，降低背景雜訊"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_split(articles: list, repeat: int) -> Dict[str, float]:
+    contents = [a["content"] for a in articles]
+    seconds = timeit(
+        lambda: split_sentence_spans_batch(contents, flag="zh", mode="paragraph"), repeat
+    )
+    return {"items": len(contents), "seconds": seconds}
+
+
+def bench_parse(articles: list, repeat: int) -> Dict[str, float]:
+    rng = random.Random(0)
+    outputs = [format_ner_output(a["entities"], rng) for a in articles]
+    parser = EntityOutputParser(ENTITY_TYPES)
+    seconds = timeit(lambda: [parser.parse(output) for output in outputs], repeat)
+    return {"items": len(outputs), "seconds": seconds}
+
+
+def bench_offsets(articles: list, repeat: int) -> Dict[str, float]:
+    seconds = timeit(
+        lambda: [EntityMatcher(a["entities"]).find(a["content"]) for a in articles],
+        repeat,
+    )
+    return {"items": len(articles), "seconds": seconds}
+
+
+def bench_bioes(articles: list, repeat: int) -> Dict[str, float]:
+    inputs = []
+    for a in articles:
+        normalized, _, chunks = formatting.split_input(a["content"])
+        for start, end in chunks:
+            text = normalized[start:end]
+            inputs.append((text, EntityMatcher(a["entities"]).find_offsets(text)))
+    seconds = timeit(lambda: [formatting.to_bioes(t, o) for t, o in inputs], repeat)
+    return {"items": len(inputs), "seconds": seconds}
+
+
+def bench_format(articles: list, repeat: int) -> Dict[str, float]:
+    rng = random.Random(0)
+    records = [
+        {
+            "input_id": a["id"],
+            "input": a["content"],
+            "openai_output": format_ner_output(a["entities"], rng),
+        }
+        for a in articles
+    ]
+    seconds = timeit(lambda: formatting.format_records(records), repeat)
+    return {"items": len(records), "seconds": seconds}
+
+
+def bench_end_to_end(articles: list, args: argparse.Namespace) -> Dict[str, float]:
+    """假 server 標記 + formatting，不使用快取，RPM/TPM 不設限"""
+    with FakeChatServer(
+        port=args.port, latency=args.latency, error_rate=args.error_rate
+    ) as server:
+        api = OpenAIAPIWrapper(API_KEY="fake", api_base=server.api_base)
+        api.transport.retry_policy.base_delay = 0.1
+        engine = AsyncLabelingEngine(
+            api=api,
+            generation_params={"temperature": 0},
+            concurrency=args.concurrency,
+            requests_per_minute=10**9,
+            tokens_per_minute=10**12,
+        )
+        start = time.perf_counter()
+        results = engine.label([NER.build_messages([a["content"][:1500]]) for a in articles])
+        formatting.format_records(
+            [
+                {"input_id": a["id"], "input": a["content"], "openai_output": result}
+                for a, result in zip(articles, results)
+                if result is not None
+            ]
+        )
+        seconds = time.perf_counter() - start
+    return {
+        "items": len(articles),
+        "seconds": seconds,
+        "requests": server.num_requests,
+        "tokens_per_article": engine.num_tokens / max(len(articles), 1),
+    }
+
+
+def bench_startup(repeat: int) -> Dict[str, float]:
+    """各入口在新 process 中的 import 時間合計，並記錄載入的重量級套件"""
+    imports = {target: measure_import(target, repeat) for target in TARGETS}
+    return {
+        "items": len(imports),
+        "seconds": sum(result["seconds"] for result in imports.values()),
+        "imports": imports,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> None:
+    """與基準結果比較 items/sec，低於 (1 - threshold) 倍視為退步"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\ncompare with {baseline['meta']['commit']} ({baseline_path})")
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = result["items_per_sec"] / base["items_per_sec"]
+        flag = "REGRESSION" if ratio < 1 - threshold else ""
+        print(
+            f"{name:<12} {base['items_per_sec']:12.1f} -> {result['items_per_sec']:12.1f}"
+            f"  x{ratio:5.2f} {flag}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NLP label generator benchmarks")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--num_articles", type=int, default=2000)
+    parser.add_argument("--num_e2e_articles", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="假 server 每個請求的延遲秒數"
+    )
+    parser.add_argument(
+        "--error_rate", type=float, default=0.0, help="假 server 回傳 500 的比例"
+    )
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--output", help="結果 json 路徑，預設 results/<commit>.json")
+    parser.add_argument("--compare", help="作為基準的結果 json")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="視為退步的吞吐量下降比例"
+    )
+    args = parser.parse_args()
+
+    articles = generate_articles(args.num_articles, seed=args.seed)
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": {},
+    }
+    bench_fns = {
+        "split": lambda: bench_split(articles, args.repeat),
+        "parse": lambda: bench_parse(articles, args.repeat),
+        "offsets": lambda: bench_offsets(articles, args.repeat),
+        "bioes": lambda: bench_bioes(articles, args.repeat),
+        "format": lambda: bench_format(articles, args.repeat),
+        "e2e": lambda: bench_end_to_end(articles[: args.num_e2e_articles], args),
+        # 與 e2e 使用不同 port，避免前一個假 server 尚未釋放
+        "batching": lambda: bench_batching(
+            articles[: args.num_e2e_articles],
+            port=args.port + 1,
+            latency=args.latency,
+            concurrency=args.concurrency,
+        ),
+        "startup": lambda: bench_startup(args.repeat),
+    }
+    for name in args.only:
+        result = bench_fns[name]()
+        result["items_per_sec"] = result["items"] / result["seconds"]
+        results["results"][name] = result
+        print(
+            f"{name:<12} {result['seconds']:8.3f}s"
+            f"  {result['items_per_sec']:12.1f} items/s"
+        )
+
+    output = (
+        Path(args.output)
+        if args.output
+        else RESULTS_DIR / f"{results['meta']['commit']}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"saved to {output}")
+    if args.compare:
+        compare(results, args.compare, args.threshold)
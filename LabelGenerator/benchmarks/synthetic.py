@@ -0,0 +1,243 @@
+"""可重現的合成中文新聞與本地假 OpenAI server，供 benchmark 使用
+
+- generate_articles: 固定 seed 產生含實體、引號、換行與全形空白的新聞
+- format_ner_output: 依實體產生 NER 任務格式的回覆 (可選條列、JSON 等變化)
+- FakeChatServer: /v1/chat/completions，可設定延遲與 5xx、429、400 及打包回覆漏篇的比例
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+# 以 cd benchmarks && python ... 執行，讓 LabelGenerator 套件可被 import
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from LabelGenerator.tasks.ner import ENTITY_TYPES
+
+ENTITIES = {
+    "組織(ORGANIZATION)": ["金管會", "經濟部", "證交所", "聯準會", "工研院"],
+    "公司(COMPANY)": ["台積電", "鴻海", "聯發科", "中華電信", "國泰金", "大立光", "廣達"],
+    "股票(STOCK)": ["2330", "2317", "2454", "台積電ADR"],
+    "人物(PERSON)": ["魏哲家", "劉揚偉", "蔡明介", "鮑爾", "黃仁勳"],
+    "國家(GPE)": ["美國", "台灣", "日本", "中國", "德國"],
+    "地點(LOCATION)": ["新竹科學園區", "台北", "亞利桑那州", "熊本"],
+    "產品(PRODUCT)": ["iPhone", "A17", "CoWoS", "AI伺服器", "3奈米製程"],
+}
+FILLER = "今日股價上漲下跌市場投資人預期營收成長晶片需求法人表示第季財報外資買超賣超供應鏈訂單出貨毛利率展望半導體產業景氣庫存調整先進製程擴產資本支出"
+PUNCTUATIONS = ["。", "，", "，", "，", "？", "！", "…", "。」", "！”"]
+_BATCH_ITEM = re.compile(r"^\[#(\d+)\] ?(.*?)(?=^\[#\d+\]|\Z)", re.MULTILINE | re.DOTALL)
+
+
+def _sentence(rng: random.Random, entities: Dict[str, List[str]]) -> str:
+    pieces = []
+    for _ in range(rng.randint(2, 6)):
+        if rng.random() < 0.3:
+            ent_type = rng.choice(ENTITY_TYPES)
+            entity = rng.choice(ENTITIES[ent_type])
+            if entity not in entities.setdefault(ent_type, []):
+                entities[ent_type].append(entity)
+            pieces.append(entity)
+        else:
+            pieces.append("".join(rng.choices(FILLER, k=rng.randint(2, 12))))
+    if rng.random() < 0.1:
+        pieces.insert(0, "「")
+    return "".join(pieces) + rng.choice(PUNCTUATIONS)
+
+
+def generate_articles(
+    num_articles: int, seed: int = 0, min_length: int = 100, max_length: int = 1400
+) -> List[dict]:
+    """Returns: [{"id", "content", "entities", "CNYES_INDUSTRY"}, ...]，相同參數結果相同"""
+    rng = random.Random(seed)
+    articles = []
+    for i in range(num_articles):
+        length = rng.randint(min_length, max_length)
+        entities, pieces, size = {}, [], 0
+        while size < length:
+            piece = _sentence(rng, entities)
+            # 段落間的換行與全形空白，模擬原始新聞需要清理的符號
+            if rng.random() < 0.08:
+                piece += rng.choice(["\n", "\r\n", "　　", "\n\n"])
+            pieces.append(piece)
+            size += len(piece)
+        articles.append(
+            {
+                "id": f"synthetic-{seed}-{i}",
+                "content": "".join(pieces),
+                "entities": {k: entities.get(k, []) for k in ENTITY_TYPES},
+                "CNYES_INDUSTRY": [{"prob": round(rng.random(), 2)}],
+            }
+        )
+    return articles
+
+
+def format_ner_output(
+    entities: Dict[str, List[str]], rng: Optional[random.Random] = None
+) -> str:
+    """依實體產生 OpenAI 的回覆，給定 rng 時混入條列、全形冒號、缺類別與 JSON 等格式變化"""
+    if rng is None or rng.random() < 0.7:
+        return "\n\n".join(
+            f"{k}: {', '.join(v) if v else '無'}" for k, v in entities.items()
+        )
+    style = rng.choice(["bullet", "fullwidth", "partial", "json"])
+    if style == "json":
+        return json.dumps(entities, ensure_ascii=False)
+    if style == "partial":
+        return "\n".join(f"{k}: {', '.join(v)}" for k, v in entities.items() if v)
+    if style == "bullet":
+        return "\n".join(
+            f"- **{k}**: " + ("、".join(v) if v else "無") for k, v in entities.items()
+        )
+    return "\n".join(f"{k}：{'，'.join(v) if v else '無'}" for k, v in entities.items())
+
+
+def find_entities(text: str) -> Dict[str, List[str]]:
+    """假 server 用：找出文本中出現的已知實體"""
+    return {k: [e for e in ENTITIES[k] if e in text] for k in ENTITY_TYPES}
+
+
+class FakeChatServer:
+    def __init__(
+        self,
+        port: int = 8765,
+        latency: float = 0.5,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        bad_request_rate: float = 0.0,
+        batch_drop_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        """在背景執行緒中啟動的假 chat completion server
+
+        回覆內容依 prompt 中出現的已知實體產生，多篇打包 ([#編號]) 時逐篇回覆
+
+        Args:
+            latency (float): 每個請求的延遲秒數
+            error_rate (float): 回傳 500 的比例
+            rate_limit_rate (float): 回傳 429 (附 Retry-After) 的比例
+            bad_request_rate (float): 回傳 400 (超過 context length) 的比例，不應重試
+            batch_drop_rate (float): 多篇打包時漏掉最後一篇回覆的比例，回覆無法完整拆回
+        """
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.bad_request_rate = bad_request_rate
+        self.batch_drop_rate = batch_drop_rate
+        self.num_requests = 0
+        self._rng = random.Random(seed)
+        self._loop = None
+        self._thread = None
+
+    @property
+    def api_base(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    async def _chat_completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.num_requests += 1
+        await asyncio.sleep(self.latency)
+        roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                status=429,
+                headers={"Retry-After": "0.1"},
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            return web.json_response(
+                {"error": {"message": "The server had an error", "type": "server_error"}},
+                status=500,
+            )
+        if roll < self.rate_limit_rate + self.error_rate + self.bad_request_rate:
+            return web.json_response(
+                {
+                    "error": {
+                        "message": "This model's maximum context length is 4097 tokens",
+                        "type": "invalid_request_error",
+                        "code": "context_length_exceeded",
+                    }
+                },
+                status=400,
+            )
+        content = body["messages"][-1]["content"]
+        items = _BATCH_ITEM.findall(content)
+        if len(items) > 1 and self._rng.random() < self.batch_drop_rate:
+            items = items[:-1]
+        if items:
+            reply = "\n\n".join(
+                f"[#{i}] {format_ner_output(find_entities(text))}" for i, text in items
+            )
+        else:
+            reply = format_ner_output(find_entities(content))
+        return web.json_response(
+            {
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": reply}}
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0},
+            }
+        )
+
+    def start(self) -> "FakeChatServer":
+        ready = threading.Event()
+
+        async def serve():
+            app = web.Application()
+            app.router.add_post("/v1/chat/completions", self._chat_completions)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", self.port).start()
+            self._loop = asyncio.get_running_loop()
+            self._stop = asyncio.Event()
+            ready.set()
+            await self._stop.wait()
+            await runner.cleanup()
+
+        self._thread = threading.Thread(target=lambda: asyncio.run(serve()), daemon=True)
+        self._thread.start()
+        if not ready.wait(timeout=10):
+            raise RuntimeError(f"Fake server failed to start on port {self.port}")
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+            self._thread.join(timeout=10)
+            self._loop = None
+
+    def __enter__(self) -> "FakeChatServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    # 單獨啟動假 server，可將 OPENAI_API_BASE 指向它執行 python -m LabelGenerator label
+    parser = argparse.ArgumentParser(description="本地假 OpenAI chat completion server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0)
+    parser.add_argument("--bad_request_rate", type=float, default=0.0)
+    parser.add_argument("--batch_drop_rate", type=float, default=0.0)
+    args = parser.parse_args()
+    with FakeChatServer(
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        bad_request_rate=args.bad_request_rate,
+        batch_drop_rate=args.batch_drop_rate,
+    ) as server:
+        print(f"Serving on {server.api_base}")
+        while True:
+            time.sleep(3600)
@@ -0,0 +1,34 @@
+"""命令列入口，子命令的模組在解析參數後才 import
+
+執行:
+    python -m LabelGenerator label --start 20230401 --end 20230407 --tasks ner sentiment
+    python -m LabelGenerator format --num_workers 8 --split
+"""
+import argparse
+import importlib
+from typing import List, Optional
+
+COMMANDS = {
+    "label": ("LabelGenerator.runner", "以 OpenAI 標記多個日期的新聞 (NER、情緒等任務)"),
+    "format": ("LabelGenerator.CustomNER.formatting", "OpenAI NER 結果轉 BIOES 標記資料"),
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m LabelGenerator",
+        description="NLP label generator",
+        epilog="各子命令的參數: python -m LabelGenerator <command> --help",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, (_, help) in COMMANDS.items():
+        # 子命令參數交由各模組的 main 解析，這裡不需 import 模組即可顯示說明
+        subparsers.add_parser(command, help=help, add_help=False)
+    args, rest = parser.parse_known_args(argv)
+    importlib.import_module(COMMANDS[args.command][0]).main(
+        rest, prog=f"{parser.prog} {args.command}"
+    )
+
+
+if __name__ == "__main__":
+    main()
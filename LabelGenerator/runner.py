@@ -0,0 +1,659 @@
+"""多個標記任務共用的執行流程
+
+每個日期的文章只讀取、計算 token、挑選與去重一次，再併發送給 --tasks 指定的各任務；
+各任務有自己的輸出 shard 與續跑紀錄，共用 API 連線池、快取、RPM/TPM 與花費上限
+
+執行: python -m LabelGenerator label --tasks ner sentiment --start 20230401 --end 20230407
+"""
+import argparse
+import asyncio
+import configparser
+import logging
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from LabelGenerator.tasks import TASKS, LabelTask, get_task
+from LabelGenerator.utils.async_utils import (
+    LABEL_BUDGET_EXCEEDED,
+    LABEL_FAILED,
+    LABEL_OK,
+    AsyncLabelingEngine,
+    RateLimiter,
+)
+from LabelGenerator.utils.budget_utils import TokenBudget, plan_run
+from LabelGenerator.utils.checkpoint_utils import ShardedCheckpoint
+from LabelGenerator.utils.data_utils import (
+    atomic_path,
+    log_setting,
+    read_data,
+    read_data_batches,
+    root_dir,
+    save_data,
+)
+from LabelGenerator.utils.dedup_utils import NearDuplicateIndex
+from LabelGenerator.utils.job_utils import (
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_PENDING,
+    JOB_RUNNING,
+    JobState,
+    date_range,
+)
+from LabelGenerator.utils.metrics_utils import Metrics
+from LabelGenerator.utils.openai_utils import OpenAIAPIWrapper
+from LabelGenerator.utils.sampling_utils import SamplingIndex, select_diverse
+
+# pandas 於讀取資料時才 import
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 所有日期合計的併發數與 OpenAI 帳號的 RPM/TPM 上限
+CONCURRENCY = 50
+REQUESTS_PER_MINUTE = 3500
+TOKENS_PER_MINUTE = 90000
+# 每個輸出 shard 的文章數，同時也是記憶體中暫存結果的上限
+SHARD_SIZE = 1000
+# 只預估 token 數、花費與時間而不實際送出
+PLAN_ONLY = False
+# 整次執行的花費上限 (TWD)
+MAX_COST = 1000
+# 串流讀取新聞時每批的筆數
+READ_BATCH_SIZE = 10000
+# 預設執行的任務 (見 LabelGenerator.tasks)，挑選文章的實體統計由第一個任務的結果累積
+TASK_NAMES = ["ner"]
+# 多篇短文打包成一次請求，每包文章的 token 總數與篇數上限
+BATCH_MODE = False
+MAX_BATCH_TOKENS = 3000
+MAX_BATCH_SIZE = 20
+# 標記前以 MinHash/LSH 排除近似重複的文章，formatting 時沿用標準版本的標記
+DEDUP = True
+DEDUP_THRESHOLD = 0.8
+# 每個日期在此 token 數 (含預估輸出) 內挑選新穎、實體稀有且彼此不相似的文章，0 為全部標記
+SAMPLE_TOKENS = 0
+SAMPLE_NOVELTY_WEIGHT = 0.5
+SAMPLE_DIVERSITY = 0.5
+
+
+def news_filter(record: dict) -> bool:
+    """任一 CNYES_INDUSTRY 機率 > 0.5 且內文少於 1500 字"""
+    return len(record["content"]) < 1500 and any(
+        industry["prob"] > 0.5 for industry in record["CNYES_INDUSTRY"] or []
+    )
+
+
+def load_news(
+    date_str: str, read_batch_size: int = READ_BATCH_SIZE
+) -> Tuple["pd.DataFrame", dict]:
+    """在 worker process 中串流讀取，只有通過產業機率與長度過濾的 id/content 會被建成 DataFrame
+
+    Returns:
+        tuple: (news, 讀取與過濾耗時的 metrics snapshot)
+    """
+    import pandas as pd
+
+    metrics = Metrics()
+    filter_seconds, num_read = 0.0, 0
+
+    def timed_filter(record: dict) -> bool:
+        nonlocal filter_seconds, num_read
+        start = time.perf_counter()
+        keep = news_filter(record)
+        filter_seconds += time.perf_counter() - start
+        num_read += 1
+        return keep
+
+    start = time.perf_counter()
+    news = pd.concat(
+        read_data_batches(
+            path=f"gs://dst-largitdata/domestic/merged-data/merged-{date_str}.ndjson.gz",
+            batch_size=read_batch_size,
+            columns=["id", "content"],
+            predicate=timed_filter,
+        ),
+        ignore_index=True,
+    )
+    metrics.observe("read", time.perf_counter() - start - filter_seconds)
+    metrics.observe("filter", filter_seconds)
+    metrics.incr("articles_read", num_read)
+    metrics.incr("articles_kept", len(news))
+    return news.drop_duplicates(subset=["content"]).reset_index(drop=True), metrics.snapshot()
+
+
+def deduplicate(
+    date_str: str,
+    news: "pd.DataFrame",
+    near_dup_index: NearDuplicateIndex,
+    index_path: str,
+    plan_only: bool = False,
+) -> "pd.DataFrame":
+    """近似重複的文章只記錄其標準版本 id，回傳需要標記的文章
+
+    plan_only 時只比對，不更新索引也不寫出結果，避免未標記的文章成為標準版本
+    """
+    dedup_checkpoint = ShardedCheckpoint(
+        output_dir="dedup_results", prefix=f"dedup-{date_str}", shard_size=SHARD_SIZE
+    )
+    news = news[
+        ~news["id"].astype(str).isin(dedup_checkpoint.done_ids())
+    ].reset_index(drop=True)
+    duplicates = near_dup_index.deduplicate(
+        news["id"], news["content"], update=not plan_only
+    )
+    is_duplicate = news["id"].astype(str).isin(duplicates)
+    if not plan_only:
+        near_dup_index.save(index_path)
+    if is_duplicate.any() and not plan_only:
+        dedup_checkpoint.write_shard(
+            {
+                "input_id": news["id"][is_duplicate].tolist(),
+                "input": news["content"][is_duplicate].tolist(),
+                "canonical_id": [
+                    duplicates[str(_id)] for _id in news["id"][is_duplicate]
+                ],
+            }
+        )
+    logging.info(f"{date_str} : {len(duplicates)} near-duplicates skipped")
+    return news[~is_duplicate].reset_index(drop=True)
+
+
+def sample_articles(
+    date_str: str,
+    news: "pd.DataFrame",
+    sampling_index: SamplingIndex,
+    costs: List[int],
+    sample_tokens: int,
+    top_k: Optional[int] = None,
+    plan_only: bool = False,
+) -> "pd.DataFrame":
+    """以已標記資料評估新穎度與實體稀有度，在 sample_tokens 內挑選彼此不相似的文章
+
+    costs 為每篇文章在所有任務的預估 token 數 (含預估輸出)；
+    挑選結果記錄在 sampling_results/sampling-{date}.json，重跑時沿用而不重新挑選，
+    plan_only 時不寫出
+    """
+    path = Path("sampling_results") / f"sampling-{date_str}.json"
+    if path.exists():
+        selected_ids = set(read_data(path=str(path))["selected_ids"])
+    else:
+        articles = news["article"].tolist()
+        selected = select_diverse(
+            vectors=sampling_index.sketch(articles),
+            scores=sampling_index.score(articles, novelty_weight=SAMPLE_NOVELTY_WEIGHT),
+            costs=costs,
+            budget=sample_tokens,
+            max_items=top_k,
+            diversity=SAMPLE_DIVERSITY,
+        )
+        selected_ids = {str(news["id"][i]) for i in selected}
+        if not plan_only:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with atomic_path(path) as tmp_path:
+                save_data(
+                    {
+                        "num_candidates": len(news),
+                        "num_tokens": sum(costs[i] for i in selected),
+                        "selected_ids": [str(news["id"][i]) for i in selected],
+                    },
+                    path=tmp_path,
+                )
+    sampled = news[news["id"].astype(str).isin(selected_ids)].reset_index(drop=True)
+    logging.info(f"{date_str} : {len(sampled)} of {len(news)} articles sampled")
+    return sampled
+
+
+def update_sampling_index(
+    sampling_index: SamplingIndex, task: LabelTask, articles: List[str], labels: list
+) -> None:
+    """將標記完成的文章與 task 解析出的實體加入索引，無法解析的輸出只計入 n-gram"""
+    sampling_index.update(articles, [task.entities(label) for label in labels])
+
+
+def build_sampling_index(
+    sampling_index: SamplingIndex, task: LabelTask, batch_size: int = 10000
+) -> None:
+    """索引為空時以 task 既有的標記結果建立"""
+    for path in sorted(Path(task.output_dir).glob(f"{task.output_prefix}-*.ndjson.gz")):
+        for batch in read_data_batches(
+            path=str(path), batch_size=batch_size, columns=["input", "openai_output"]
+        ):
+            update_sampling_index(
+                sampling_index,
+                task,
+                [content[:1500] for content in batch["input"]],
+                [task.parse(output)[0] for output in batch["openai_output"]],
+            )
+
+
+def template_tokens(task: LabelTask, engine: AsyncLabelingEngine) -> int:
+    """單篇 prompt 除了文章以外的 token 數，加上文章本身的 token 數即為請求的 token 數"""
+    return engine.api.num_tokens_from_messages(
+        messages=task.build_messages([""]), model=engine.model
+    )
+
+
+async def label_task(
+    date_str: str,
+    task: LabelTask,
+    news: "pd.DataFrame",
+    engine: AsyncLabelingEngine,
+    args: argparse.Namespace,
+    sampling_index: SamplingIndex = None,
+    sampling_lock: asyncio.Lock = None,
+) -> dict:
+    """以 task 標記 news 並分批寫入 shard，news 需有 article 與 num_tokens 欄位
+
+    sampling_index 不為 None 時，以解析出的實體更新挑選文章用的統計
+
+    Returns:
+        dict: 文章數、實際標記數、失敗數與其 id、token 數、預估計畫與是否達到花費上限
+    """
+    # 重跑時略過此任務已寫入 shard 的文章
+    checkpoint = ShardedCheckpoint(
+        output_dir=task.output_dir,
+        prefix=f"{task.output_prefix}-{date_str}",
+        shard_size=SHARD_SIZE,
+    )
+    done_ids = checkpoint.done_ids()
+    num_articles = len(news)
+    news = news[~news["id"].astype(str).isin(done_ids)].reset_index(drop=True)
+    logging.info(f"{date_str} {task.name} : {len(done_ids)} done, {len(news)} remaining")
+
+    articles = news["article"].tolist()
+    # 文章的 token 數已在 label_date 算好，只需加上模板的 token 數
+    num_input_tokens = (news["num_tokens"] + template_tokens(task, engine)).tolist()
+    with engine.api.metrics.timer("plan", task=task.name):
+        plan = plan_run(
+            api=engine.api,
+            messages_list=None,
+            expected_output_tokens=engine.expected_output_tokens,
+            concurrency=engine.concurrency,
+            requests_per_minute=engine.rate_limiter.requests_per_minute,
+            tokens_per_minute=engine.rate_limiter.tokens_per_minute,
+            currency="TWD",
+            num_input_tokens=num_input_tokens,
+        )
+    logging.info(f"{date_str} {task.name} plan : {plan}")
+    stats = {
+        "num_articles": num_articles,
+        "num_labeled": 0,
+        "failed": 0,
+        "failed_ids": [],
+        "plan": plan,
+        "budget_reached": False,
+    }
+    if args.plan_only:
+        return stats
+
+    parse_results = Counter()
+    for start in range(0, len(news), checkpoint.shard_size):
+        end = start + checkpoint.shard_size
+        batch = news.iloc[start:end]
+        if args.batch_mode and task.batch_prompt:
+            results = await engine.alabel_packed(
+                articles[start:end],
+                build_messages=task.build_messages,
+                max_batch_tokens=MAX_BATCH_TOKENS,
+                max_batch_size=MAX_BATCH_SIZE,
+                num_tokens=batch["num_tokens"].tolist(),
+                return_status=True,
+            )
+        else:
+            results = await engine.alabel(
+                [task.build_messages([article]) for article in articles[start:end]],
+                num_input_tokens_list=num_input_tokens[start:end],
+                return_status=True,
+            )
+        # 失敗與超過花費上限的文章不寫入 shard，下次執行時重送
+        statuses = [status for _, status in results]
+        finished = [i for i, status in enumerate(statuses) if status == LABEL_OK]
+        failed = [i for i, status in enumerate(statuses) if status == LABEL_FAILED]
+        if failed:
+            # 重試後仍失敗或不可重試 (例如 400) 的文章只記錄下來，不影響其他文章
+            stats["failed"] += len(failed)
+            stats["failed_ids"].extend(batch["id"].iloc[failed].astype(str).tolist())
+            engine.api.metrics.incr("articles_failed", len(failed), task=task.name)
+        if finished:
+            outputs = [results[i][0] for i in finished]
+            labels, reasons = zip(*[task.parse(output) for output in outputs])
+            parse_results.update(reasons)
+            with engine.api.metrics.timer("write", task=task.name):
+                checkpoint.write_shard(
+                    {
+                        "input_id": batch["id"].iloc[finished].tolist(),
+                        "input": batch["content"].iloc[finished].tolist(),
+                        "openai_output": outputs,
+                        "label": list(labels),
+                        "parse_result": list(reasons),
+                    }
+                )
+            if sampling_index is not None:
+                async with sampling_lock:
+                    await asyncio.to_thread(
+                        update_sampling_index,
+                        sampling_index,
+                        task,
+                        [articles[start + i] for i in finished],
+                        labels,
+                    )
+        stats["num_labeled"] += len(finished)
+        engine.api.metrics.incr("articles_labeled", len(finished), task=task.name)
+        if LABEL_BUDGET_EXCEEDED in statuses:
+            stats["budget_reached"] = True
+            break
+
+    for reason, count in parse_results.items():
+        engine.api.metrics.incr("parse_results", count, task=task.name, reason=reason)
+    stats["parse_results"] = dict(parse_results)
+    stats["num_tokens"] = engine.num_tokens
+    stats["cost"] = engine.api.price_counter(num_tokens=engine.num_tokens, currency="TWD")
+    logging.info(f'{date_str} {task.name} : {stats["cost"]}')
+    return stats
+
+
+async def label_date(
+    date_str: str,
+    news: "pd.DataFrame",
+    engines: Dict[str, AsyncLabelingEngine],
+    args: argparse.Namespace,
+    near_dup_index: NearDuplicateIndex = None,
+    dedup_lock: asyncio.Lock = None,
+    sampling_index: SamplingIndex = None,
+    sampling_lock: asyncio.Lock = None,
+) -> dict:
+    """計算 token、挑選文章與去重各做一次，再併發執行 engines 中的各任務
+
+    Args:
+        engines (dict): {任務名稱: 該任務使用的 engine}，依 args.tasks 的順序
+
+    Returns:
+        dict: 各任務的統計 (tasks)、合計標記數、token 數、花費與是否有任務達到花費上限
+    """
+    tasks = [get_task(name) for name in engines]
+    api = next(iter(engines.values())).api
+    model = next(iter(engines.values())).model
+    num_articles = len(news)
+
+    # 所有任務共用同一份截斷後的文章與其 token 數
+    news = news.assign(article=[content[:1500] for content in news["content"]])
+    with api.metrics.timer("tokenize"):
+        news["num_tokens"] = await asyncio.to_thread(
+            api.num_tokens_batch, news["article"].tolist(), model
+        )
+
+    if sampling_index is not None:
+        overhead = sum(
+            template_tokens(task, engines[task.name]) + engines[task.name].expected_output_tokens
+            for task in tasks
+        )
+        costs = (news["num_tokens"] * len(tasks) + overhead).tolist()
+        async with sampling_lock:
+            with api.metrics.timer("sample"):
+                num_before = len(news)
+                news = await asyncio.to_thread(
+                    sample_articles,
+                    date_str,
+                    news,
+                    sampling_index,
+                    costs,
+                    args.sample_tokens,
+                    args.sample_top_k,
+                    args.plan_only,
+                )
+            api.metrics.incr("articles_sampled_out", num_before - len(news))
+
+    if near_dup_index is not None:
+        # 挑選之後才去重，索引只加入會被標記的文章，避免重複文章的標準版本永遠未標記；
+        # 索引跨日期共用，同時只能有一個日期比對與寫入
+        async with dedup_lock:
+            with api.metrics.timer("dedup"):
+                num_before = len(news)
+                news = await asyncio.to_thread(
+                    deduplicate,
+                    date_str,
+                    news,
+                    near_dup_index,
+                    args.near_dup_index_path,
+                    args.plan_only,
+                )
+            api.metrics.incr("articles_duplicate", num_before - len(news))
+
+    task_stats = await asyncio.gather(
+        *[
+            label_task(
+                date_str,
+                task,
+                news,
+                engines[task.name],
+                args,
+                # 只以第一個任務的結果累積實體統計，避免同一篇文章重複計入
+                sampling_index if i == 0 else None,
+                sampling_lock,
+            )
+            for i, task in enumerate(tasks)
+        ]
+    )
+
+    if sampling_index is not None and not args.plan_only:
+        async with sampling_lock:
+            await asyncio.to_thread(sampling_index.save, args.sampling_index_path)
+    stats = {
+        "num_articles": num_articles,
+        "num_labeled": sum(s["num_labeled"] for s in task_stats),
+        "failed": sum(s["failed"] for s in task_stats),
+        "budget_reached": any(s["budget_reached"] for s in task_stats),
+        "tasks": dict(zip(engines, task_stats)),
+    }
+    if not args.plan_only:
+        stats["num_tokens"] = sum(s["num_tokens"] for s in task_stats)
+        stats["cost"] = sum(s["cost"] for s in task_stats)
+    return stats
+
+
+def write_metrics(metrics: Metrics, path_prefix: str) -> None:
+    """寫出 {path_prefix}.json 與供 node_exporter textfile collector 讀取的 {path_prefix}.prom"""
+    metrics.write_json(f"{path_prefix}.json")
+    metrics.write_prometheus(f"{path_prefix}.prom")
+
+
+async def run_jobs(date_strs: list, args: argparse.Namespace) -> None:
+    """多個日期、多個任務共用同一個 API 連線池、快取、RPM/TPM 上限與花費上限併發標記
+
+    讀取與過濾在 process pool 中進行，每個日期的狀態記錄在 args.state_file
+    """
+    tasks = [get_task(name) for name in args.tasks]
+    config = configparser.ConfigParser()
+    config.read_file(open(root_dir / "secret.cfg"))
+    api = OpenAIAPIWrapper(
+        API_KEY=config.get("OPENAI", "API_KEY"),
+        cache_path=str(root_dir / "cache" / "openai_cache.sqlite"),
+        log_sample_rate=args.log_sample_rate,
+    )
+    budget = TokenBudget(api=api, max_cost=args.max_cost, currency="TWD")
+    rate_limiter = RateLimiter(
+        requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE
+    )
+    # 跨日期保存的近似重複索引，每天只需與既有簽章比對
+    near_dup_index = (
+        NearDuplicateIndex.load(args.near_dup_index_path, threshold=DEDUP_THRESHOLD)
+        if args.dedup
+        else None
+    )
+    dedup_lock = asyncio.Lock()
+    # 以已標記資料的 n-gram 與實體統計挑選文章，跨日期持續累積
+    sampling_index = None
+    if args.sample_tokens:
+        sampling_index = SamplingIndex.load(args.sampling_index_path)
+        if not sampling_index.num_docs:
+            await asyncio.to_thread(build_sampling_index, sampling_index, tasks[0])
+    sampling_lock = asyncio.Lock()
+
+    state = JobState(args.state_file)
+
+    def finished_tasks(date_str: str) -> set:
+        """已完成的日期所執行過的任務，加入多任務前的紀錄只有 NER"""
+        if state.status(date_str) != JOB_DONE:
+            return set()
+        return set(state.jobs[date_str].get("tasks", ["ner"]))
+
+    if not args.force:
+        # 包含本次所有任務才略過，新增任務時只會標記新任務尚未完成的文章
+        skipped = [d for d in date_strs if set(args.tasks) <= finished_tasks(d)]
+        if skipped:
+            logging.info(f"Skip finished dates : {skipped}")
+        date_strs = [d for d in date_strs if d not in skipped]
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(args.num_jobs)
+    totals = Counter()
+    # spawn 避免 fork 時複製到 gcsfs 的 event loop 執行緒
+    executor = ProcessPoolExecutor(
+        max_workers=args.num_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+    async def run_date(date_str: str) -> None:
+        async with semaphore:
+            previous_tasks = state.jobs.get(date_str, {}).get("tasks", {})
+            state.update(date_str, JOB_RUNNING)
+            start = time.perf_counter()
+            try:
+                news, load_metrics = await loop.run_in_executor(
+                    executor, load_news, date_str, args.read_batch_size
+                )
+                api.metrics.merge(load_metrics)
+                engines = {
+                    task.name: AsyncLabelingEngine(
+                        api=api,
+                        generation_params={"temperature": 0},
+                        # 總併發數平均分給同時執行的日期與任務
+                        concurrency=max(1, CONCURRENCY // (args.num_jobs * len(tasks))),
+                        expected_output_tokens=task.expected_output_tokens,
+                        budget=budget,
+                        rate_limiter=rate_limiter,
+                    )
+                    for task in tasks
+                }
+                stats = await label_date(
+                    date_str,
+                    news,
+                    engines,
+                    args,
+                    near_dup_index,
+                    dedup_lock,
+                    sampling_index,
+                    sampling_lock,
+                )
+            except Exception as err:
+                logging.exception(f"{date_str} failed")
+                state.update(date_str, JOB_FAILED, error=repr(err))
+                return
+            # 達到花費上限、有文章失敗或只做預估時保留為 pending，
+            # 下次執行時各任務只重送 shard 中還沒有的文章
+            done = not (stats["budget_reached"] or stats["failed"] or args.plan_only)
+            stats["tasks"] = {**previous_tasks, **stats["tasks"]}
+            state.update(
+                date_str,
+                JOB_DONE if done else JOB_PENDING,
+                error=None,
+                seconds=round(time.perf_counter() - start, 1),
+                **stats,
+            )
+            totals.update(
+                num_labeled=stats["num_labeled"], num_tokens=stats.get("num_tokens", 0)
+            )
+            write_metrics(api.metrics, args.metrics_path)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[run_date(date_str) for date_str in date_strs])
+    finally:
+        executor.shutdown()
+        await api.transport.aclose()
+
+    elapsed = time.perf_counter() - start
+    logging.info(
+        f"{len(date_strs)} dates : {totals['num_labeled']} articles, "
+        f"{totals['num_labeled'] / elapsed:.2f} articles/s, "
+        f"{totals['num_tokens'] / elapsed:.1f} tokens/s, "
+        f"spent {budget.spent:.2f} TWD in {elapsed:.0f}s"
+    )
+    write_metrics(api.metrics, args.metrics_path)
+    logging.info(f"cache : {api.cache.stats()}")
+    logging.info(f"metrics : {api.metrics.summary()['timers']}")
+    logging.info(f"status : { {d: state.status(d) for d in date_strs} }")
+
+
+def build_parser(prog: Optional[str] = None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=prog, description="以 OpenAI 標記多個日期的新聞")
+    parser.add_argument(
+        "--tasks",
+        nargs="+",
+        default=TASK_NAMES,
+        choices=sorted(TASKS),
+        metavar="TASK",
+        help=f"同時執行的標記任務 ({', '.join(sorted(TASKS))})，每篇文章只讀取與計算 token 一次",
+    )
+    parser.add_argument("--dates", nargs="+", help="指定日期 YYYYMMDD")
+    parser.add_argument("--start", help="日期範圍起點 YYYYMMDD (含)")
+    parser.add_argument("--end", help="日期範圍終點 YYYYMMDD (含)")
+    parser.add_argument("--num_jobs", type=int, default=2, help="同時標記的日期數")
+    parser.add_argument("--num_workers", type=int, default=2, help="讀取資料的 process 數")
+    parser.add_argument("--state_file", default="prompt_job_state.json")
+    parser.add_argument("--force", action="store_true", help="重跑已完成的日期")
+    parser.add_argument("--plan_only", action="store_true", default=PLAN_ONLY)
+    parser.add_argument("--batch_mode", action="store_true", default=BATCH_MODE)
+    parser.add_argument("--no_dedup", dest="dedup", action="store_false", default=DEDUP)
+    parser.add_argument("--max_cost", type=float, default=MAX_COST, help="花費上限 (TWD)")
+    parser.add_argument("--read_batch_size", type=int, default=READ_BATCH_SIZE)
+    parser.add_argument(
+        "--metrics_path", default="prompt_metrics", help="metrics 輸出路徑 (不含副檔名)"
+    )
+    parser.add_argument(
+        "--log_sample_rate", type=float, default=0.0, help="抽樣記錄完整 prompt 與回覆的比例"
+    )
+    parser.add_argument(
+        "--near_dup_index_path", default=str(root_dir / "cache" / "near_dup_index")
+    )
+    parser.add_argument(
+        "--sample_tokens",
+        type=int,
+        default=SAMPLE_TOKENS,
+        help="每個日期挑選文章的 token 上限，0 為全部標記",
+    )
+    parser.add_argument("--sample_top_k", type=int, help="每個日期最多挑選的文章數")
+    parser.add_argument(
+        "--sampling_index_path", default=str(root_dir / "cache" / "sampling_index")
+    )
+    return parser
+
+
+def label_dates(date_strs: List[str], **options) -> None:
+    """以程式呼叫的入口，options 與命令列參數同名 (例如 tasks=["ner", "sentiment"], plan_only=True)"""
+    args = build_parser().parse_args([])
+    unknown = set(options) - set(vars(args))
+    if unknown:
+        raise TypeError(f"Unknown options: {sorted(unknown)}")
+    vars(args).update(options)
+    log_setting()
+    asyncio.run(run_jobs(date_strs, args))
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> None:
+    parser = build_parser(prog)
+    args = parser.parse_args(argv)
+    if args.dates:
+        date_strs = args.dates
+    elif args.start and args.end:
+        date_strs = date_range(args.start, args.end)
+    else:
+        parser.error("either --dates or --start/--end is required")
+
+    log_setting()
+    asyncio.run(run_jobs(date_strs, args))
+
+
+if __name__ == "__main__":
+    main()
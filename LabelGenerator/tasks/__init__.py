@@ -0,0 +1,22 @@
+"""標記任務的註冊表，import 時註冊內建的 ner、sentiment、perspective
+
+自訂任務:
+    from LabelGenerator.tasks import ClassificationTask, register_task
+    register_task(ClassificationTask("topic", labels=[...], question="的主題"))
+"""
+from .base import TASKS, LabelTask, get_task, register_task
+from .classification import PERSPECTIVE, SENTIMENT, ClassificationTask
+from .ner import ENTITY_TYPES, NER, NERTask
+
+__all__ = [
+    "TASKS",
+    "LabelTask",
+    "get_task",
+    "register_task",
+    "ClassificationTask",
+    "SENTIMENT",
+    "PERSPECTIVE",
+    "ENTITY_TYPES",
+    "NER",
+    "NERTask",
+]
@@ -0,0 +1,81 @@
+from typing import Dict, List, Optional, Tuple
+
+from LabelGenerator.utils.batching_utils import build_batch_content
+from LabelGenerator.utils.parser_utils import PARSE_EMPTY, PARSE_OK
+
+
+class LabelTask:
+    def __init__(
+        self,
+        name: str,
+        prompt: str,
+        batch_prompt: Optional[str] = None,
+        output_schema: Optional[dict] = None,
+        expected_output_tokens: int = 256,
+        output_dir: Optional[str] = None,
+        output_prefix: Optional[str] = None,
+    ):
+        """一種標記任務：prompt 模板、回覆的解析方式與輸出格式
+
+        同一批文章可同時跑多個任務，文章只讀取與計算 token 一次 (見 LabelGenerator.runner)
+
+        Args:
+            name (str): 任務名稱，命令列以 --tasks 指定
+            prompt (str): 單篇的 prompt，以 {article} 代入文章
+            batch_prompt (str): 多篇打包的 prompt，以 {articles} 代入 [#編號] 開頭的文章；
+                None 時此任務不使用打包模式
+            output_schema (dict): 解析後 label 欄位的 JSON schema，供下游檢查與說明
+            expected_output_tokens (int): 每篇的預估回覆 token 數，用於預估花費與 TPM
+            output_dir / output_prefix: 輸出 shard 的位置，預設為 {name}_results/{name}_result-{date}
+        """
+        self.name = name
+        self.prompt = prompt
+        self.batch_prompt = batch_prompt
+        self.output_schema = output_schema or {}
+        self.expected_output_tokens = expected_output_tokens
+        self.output_dir = output_dir or f"{name}_results"
+        self.output_prefix = output_prefix or f"{name}_result"
+
+    def build_messages(self, articles: List[str]) -> List[dict]:
+        """單篇使用 prompt，多篇以 [#編號] 打包後使用 batch_prompt"""
+        if len(articles) == 1:
+            return [{"role": "user", "content": self.prompt.format(article=articles[0])}]
+        return [
+            {
+                "role": "user",
+                "content": self.batch_prompt.format(articles=build_batch_content(articles)),
+            }
+        ]
+
+    def parse(self, output: Optional[str]) -> Tuple[Optional[object], str]:
+        """
+        Returns:
+            tuple: (符合 output_schema 的結果或解析失敗時的 None, parser_utils 的原因碼)
+        """
+        if not output or not output.strip():
+            return None, PARSE_EMPTY
+        return output.strip(), PARSE_OK
+
+    def entities(self, parsed: Optional[object]) -> Dict[str, List[str]]:
+        """解析結果中的實體 ({實體類別: [實體字串, ...]})，用於累積挑選文章時的實體統計"""
+        return {}
+
+    def __repr__(self):
+        return f"{type(self).__name__}(name={self.name!r})"
+
+
+TASKS: Dict[str, LabelTask] = {}
+
+
+def register_task(task: LabelTask) -> LabelTask:
+    """註冊後即可以 --tasks {task.name} 或 label_dates(..., tasks=[task.name]) 使用"""
+    if task.name in TASKS:
+        raise ValueError(f"Task {task.name!r} is already registered")
+    TASKS[task.name] = task
+    return task
+
+
+def get_task(name: str) -> LabelTask:
+    if name not in TASKS:
+        raise KeyError(f"Unknown task {name!r}, available: {sorted(TASKS)}")
+    return TASKS[name]
@@ -0,0 +1,60 @@
+import re
+from typing import Optional, Sequence, Tuple
+
+from LabelGenerator.utils.parser_utils import (
+    PARSE_AMBIGUOUS,
+    PARSE_EMPTY,
+    PARSE_NO_CATEGORY,
+    PARSE_OK,
+)
+
+from .base import LabelTask, register_task
+
+
+class ClassificationTask(LabelTask):
+    def __init__(self, name: str, labels: Sequence[str], question: str, **kwargs):
+        """單選分類，label 為 labels 其中之一
+
+        Args:
+            labels (list): 類別，如 ["正面", "負面", "中立"]
+            question (str): 接在「請判斷文本」之後的問題，如 "對提及公司的情緒"
+        """
+        self.labels = list(labels)
+        choices = "、".join(self.labels)
+        kwargs.setdefault(
+            "prompt", f"文本:{{article}}。請判斷文本{question}，只回答{choices}其中之一"
+        )
+        kwargs.setdefault(
+            "batch_prompt",
+            f"以下有多篇文本，每篇以 [#編號] 開頭:\n{{articles}}\n"
+            f"請分別判斷每篇文本{question}，每篇只回答{choices}其中之一，"
+            f"每篇的結果以相同的 [#編號] 開頭",
+        )
+        kwargs.setdefault("output_schema", {"type": "string", "enum": self.labels})
+        kwargs.setdefault("expected_output_tokens", 8)
+        super().__init__(name, **kwargs)
+        # 較長的類別優先比對，避免其中一個類別是另一個的子字串
+        self._pattern = re.compile(
+            "|".join(re.escape(label) for label in sorted(self.labels, key=len, reverse=True))
+        )
+
+    def parse(self, output: Optional[str]) -> Tuple[Optional[str], str]:
+        """回覆中恰好出現一種類別才視為成功，容許前後的說明文字"""
+        if not output or not output.strip():
+            return None, PARSE_EMPTY
+        found = set(self._pattern.findall(output))
+        if not found:
+            return None, PARSE_NO_CATEGORY
+        if len(found) > 1:
+            return None, PARSE_AMBIGUOUS
+        return found.pop(), PARSE_OK
+
+
+SENTIMENT = register_task(
+    ClassificationTask("sentiment", labels=["正面", "負面", "中立"], question="的整體情緒")
+)
+PERSPECTIVE = register_task(
+    ClassificationTask(
+        "perspective", labels=["看多", "看空", "中立"], question="對提及的公司或市場的看法"
+    )
+)
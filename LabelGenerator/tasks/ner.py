@@ -0,0 +1,50 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from LabelGenerator.utils.parser_utils import EntityOutputParser
+
+from .base import LabelTask, register_task
+
+ENTITY_TYPES = [
+    "組織(ORGANIZATION)",
+    "公司(COMPANY)",
+    "股票(STOCK)",
+    "人物(PERSON)",
+    "國家(GPE)",
+    "地點(LOCATION)",
+    "產品(PRODUCT)",
+]
+
+
+class NERTask(LabelTask):
+    def __init__(self, name: str = "ner", entity_types: Sequence[str] = ENTITY_TYPES, **kwargs):
+        """列出文章中各類別的實體，label 為 {實體類別: [實體字串, ...]}"""
+        self.entity_types = list(entity_types)
+        types = "、".join(self.entity_types)
+        kwargs.setdefault("prompt", f"文本:{{article}}。請從文本中列出所有{types}")
+        kwargs.setdefault(
+            "batch_prompt",
+            f"以下有多篇文本，每篇以 [#編號] 開頭:\n{{articles}}\n"
+            f"請分別從每篇文本中列出所有{types}，每篇的結果以相同的 [#編號] 開頭",
+        )
+        kwargs.setdefault(
+            "output_schema",
+            {
+                "type": "object",
+                "properties": {
+                    ent_type: {"type": "array", "items": {"type": "string"}}
+                    for ent_type in self.entity_types
+                },
+            },
+        )
+        super().__init__(name, **kwargs)
+        self.output_parser = EntityOutputParser(self.entity_types)
+
+    def parse(self, output: Optional[str]) -> Tuple[Optional[Dict[str, list]], str]:
+        return self.output_parser.parse(output)
+
+    def entities(self, parsed: Optional[Dict[str, list]]) -> Dict[str, List[str]]:
+        return parsed or {}
+
+
+# 沿用原本 prompt_results/prompt_result-{date} 的輸出位置，formatting 不需修改
+NER = register_task(NERTask(output_dir="prompt_results", output_prefix="prompt_result"))
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .batching_utils import demux_batch_response, pack_batches
+from .budget_utils import BudgetExceededError, TokenBudget
+from .openai_utils import OpenAIAPIWrapper
+
+# 每個請求的結果狀態，return_status=True 時與結果一併回傳
+LABEL_OK = "ok"
+LABEL_BUDGET_EXCEEDED = "budget_exceeded"  # 超過花費上限而未送出
+LABEL_FAILED = "failed"  # 重試用盡或不可重試的錯誤 (例如 400)
+
+
+class RateLimiter:
+    def __init__(
+        self, requests_per_minute: int = 3500, tokens_per_minute: int = 90000
+    ):
+        """以 token bucket 同時限制每分鐘請求數 (RPM) 與 token 數 (TPM)"""
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._available_requests = float(requests_per_minute)
+        self._available_tokens = float(tokens_per_minute)
+        self._last_update = time.monotonic()
+        self._lock = None
+        self._loop = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_update
+        self._last_update = now
+        self._available_requests = min(
+            self.requests_per_minute,
+            self._available_requests + elapsed * self.requests_per_minute / 60,
+        )
+        self._available_tokens = min(
+            self.tokens_per_minute,
+            self._available_tokens + elapsed * self.tokens_per_minute / 60,
+        )
+
+    async def acquire(self, num_tokens: int = 0) -> None:
+        """等待直到額度足夠送出一個用量為 num_tokens 的請求"""
+        # 單一請求超過每分鐘上限時，最多等滿一整個 bucket
+        num_tokens = min(num_tokens, self.tokens_per_minute)
+        # Lock 綁定 event loop，每次 asyncio.run 都是新的 loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock, self._loop = asyncio.Lock(), loop
+        async with self._lock:
+            while True:
+                self._refill()
+                if (
+                    self._available_requests >= 1
+                    and self._available_tokens >= num_tokens
+                ):
+                    self._available_requests -= 1
+                    self._available_tokens -= num_tokens
+                    return
+                wait = max(
+                    (1 - self._available_requests) * 60 / self.requests_per_minute,
+                    (num_tokens - self._available_tokens) * 60 / self.tokens_per_minute,
+                )
+                await asyncio.sleep(wait)
+
+
+class AsyncLabelingEngine:
+    def __init__(
+        self,
+        api: OpenAIAPIWrapper,
+        model: str = "gpt-3.5-turbo",
+        generation_params: Optional[dict] = None,
+        concurrency: int = 50,
+        requests_per_minute: int = 3500,
+        tokens_per_minute: int = 90000,
+        expected_output_tokens: int = 256,
+        budget: Optional[TokenBudget] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ):
+        """以 asyncio 併發送出 chat completion，並受限於併發數與 RPM/TPM
+
+        expected_output_tokens: 送出前預估的回覆 token 數，用於 TPM 額度計算
+        budget: 花費上限，達到後不再送出新請求，未送出的結果為 None
+        rate_limiter: 多個 engine 共用同一個 RPM/TPM 上限時傳入，此時忽略 requests_per_minute/tokens_per_minute
+
+        重試、退避與斷路由 api.transport 處理，重試用盡或不可重試的錯誤結果為 None
+        """
+        self.api = api
+        self.model = model
+        self.generation_params = generation_params
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter or RateLimiter(
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+        )
+        self.expected_output_tokens = expected_output_tokens
+        self.budget = budget
+        self.num_tokens = 0
+        self.num_requests = 0
+
+    async def _label_one(
+        self,
+        semaphore: asyncio.Semaphore,
+        messages: List[dict],
+        num_input_tokens: int,
+        expected_output_tokens: Optional[int] = None,
+    ) -> Tuple[Optional[str], str]:
+        """
+        Returns:
+            tuple: (回覆, 狀態)，狀態不是 LABEL_OK 時回覆為 None
+        """
+        if expected_output_tokens is None:
+            expected_output_tokens = self.expected_output_tokens
+        estimated_tokens = num_input_tokens + expected_output_tokens
+        dispatched = False
+
+        # 快取命中時不會呼叫，也就不佔用 RPM/TPM 與花費額度
+        # 每次重試都會呼叫，但花費額度只預留一次
+        async def before_request():
+            nonlocal dispatched
+            if not dispatched:
+                if self.budget is not None:
+                    self.budget.reserve(estimated_tokens)
+                dispatched = True
+            await self.rate_limiter.acquire(estimated_tokens)
+
+        async with semaphore:
+            try:
+                result = await self.api.aget_chat_completion(
+                    messages,
+                    model=self.model,
+                    generation_params=self.generation_params,
+                    before_request=before_request,
+                )
+            except BudgetExceededError:
+                return None, LABEL_BUDGET_EXCEEDED
+            except Exception as err:
+                logging.error(err)
+                self.api.metrics.incr("requests_failed")
+                if dispatched and self.budget is not None:
+                    self.budget.release(estimated_tokens)
+                return None, LABEL_FAILED
+
+        if dispatched:
+            used_tokens = num_input_tokens + self.api.num_tokens_from_messages(
+                messages=[{"output": result}], model=self.model
+            )
+            self.num_tokens += used_tokens
+            self.num_requests += 1
+            self.api.metrics.incr("tokens_in", num_input_tokens)
+            self.api.metrics.incr("tokens_out", used_tokens - num_input_tokens)
+            if self.budget is not None:
+                self.budget.commit(estimated_tokens, used_tokens)
+        return result, LABEL_OK
+
+    async def alabel(
+        self,
+        messages_list: List[List[dict]],
+        num_input_tokens_list: Optional[Sequence[int]] = None,
+        return_status: bool = False,
+    ) -> list:
+        """併發標記，回傳結果順序與 messages_list 相同
+
+        未成功的結果為 None；return_status=True 時每筆為 (回覆, LABEL_* 狀態)，
+        可區分超過花費上限與請求失敗
+        num_input_tokens_list: 已預先計算的每個請求 token 數，未指定時在此計算
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        if num_input_tokens_list is None:
+            with self.api.metrics.timer("tokenize"):
+                num_input_tokens_list = self.api.num_tokens_from_messages_batch(
+                    messages_list=messages_list, model=self.model
+                )
+        results = await asyncio.gather(
+            *[
+                self._label_one(semaphore, messages, num_input_tokens)
+                for messages, num_input_tokens in zip(
+                    messages_list, num_input_tokens_list
+                )
+            ]
+        )
+        return results if return_status else [result for result, _ in results]
+
+    async def _run_and_close(self, coro):
+        # 連線池綁定 event loop，asyncio.run 結束前關閉
+        try:
+            return await coro
+        finally:
+            await self.api.transport.aclose()
+
+    def label(self, messages_list: List[List[dict]]) -> List[Optional[str]]:
+        return asyncio.run(self._run_and_close(self.alabel(messages_list)))
+
+    async def _label_packed(
+        self,
+        semaphore: asyncio.Semaphore,
+        items: List[str],
+        item_tokens: List[int],
+        build_messages: Callable[[List[str]], List[dict]],
+        template_tokens: Dict[int, int],
+    ) -> List[Tuple[Optional[str], str]]:
+        # 請求 token 數 = 各篇 token 數 + 模板 (以空字串代入) 的 token 數，不重新編碼文章
+        if len(items) not in template_tokens:
+            template_tokens[len(items)] = self.api.num_tokens_from_messages(
+                messages=build_messages([""] * len(items)), model=self.model
+            )
+        result, status = await self._label_one(
+            semaphore,
+            build_messages(items),
+            template_tokens[len(items)] + sum(item_tokens),
+            expected_output_tokens=self.expected_output_tokens * len(items),
+        )
+        if status != LABEL_OK or len(items) == 1:
+            return [(result, status)] * len(items)
+
+        parts = demux_batch_response(result, len(items))
+        if all(part is not None for part in parts):
+            return [(part, LABEL_OK) for part in parts]
+        # 無法完整拆回每篇時，對半切開重送
+        logging.warning(f"Cannot demultiplex batch of {len(items)}, splitting")
+        half = len(items) // 2
+        left, right = await asyncio.gather(
+            *[
+                self._label_packed(
+                    semaphore,
+                    items[part],
+                    item_tokens[part],
+                    build_messages,
+                    template_tokens,
+                )
+                for part in (slice(None, half), slice(half, None))
+            ]
+        )
+        return left + right
+
+    async def alabel_packed(
+        self,
+        items: List[str],
+        build_messages: Callable[[List[str]], List[dict]],
+        max_batch_tokens: int = 3000,
+        max_batch_size: int = 20,
+        num_tokens: Optional[Sequence[int]] = None,
+        return_status: bool = False,
+    ) -> list:
+        """多篇文章打包成一次請求，回覆依 [#編號] 拆回，順序與 items 相同
+
+        回傳格式與 alabel 相同，整包請求失敗時包內每篇皆為 LABEL_FAILED
+
+        build_messages(items) 需在多篇時以 batching_utils.build_batch_content 標號，
+        單篇時使用一般的單篇 prompt (拆包失敗最終會退回單篇)
+        num_tokens: 已預先計算的每篇 token 數 (不含模板)，未指定時在此計算
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        if num_tokens is None:
+            with self.api.metrics.timer("tokenize"):
+                num_tokens = self.api.num_tokens_batch(items, model=self.model)
+        batches = pack_batches(
+            num_tokens, max_tokens=max_batch_tokens, max_batch_size=max_batch_size
+        )
+        template_tokens = {}
+        results = await asyncio.gather(
+            *[
+                self._label_packed(
+                    semaphore,
+                    [items[i] for i in batch],
+                    [num_tokens[i] for i in batch],
+                    build_messages,
+                    template_tokens,
+                )
+                for batch in batches
+            ]
+        )
+        results = [part for parts in results for part in parts]
+        return results if return_status else [result for result, _ in results]
+
+    def label_packed(
+        self,
+        items: List[str],
+        build_messages: Callable[[List[str]], List[dict]],
+        max_batch_tokens: int = 3000,
+        max_batch_size: int = 20,
+    ) -> List[Optional[str]]:
+        return asyncio.run(
+            self._run_and_close(
+                self.alabel_packed(items, build_messages, max_batch_tokens, max_batch_size)
+            )
+        )
@@ -0,0 +1,47 @@
+import re
+from typing import List, Optional, Sequence
+
+# 每篇文章以 [#編號] 開頭，回覆也以相同編號分段
+_BATCH_ITEM_HEADER = re.compile(r"^[ \t]*\[#(\d+)\][ \t]*", re.MULTILINE)
+
+
+def pack_batches(
+    num_tokens: Sequence[int], max_tokens: int, max_batch_size: int = 20
+) -> List[List[int]]:
+    """依序把項目打包，每包 token 總數不超過 max_tokens、項目數不超過 max_batch_size
+
+    單一項目超過 max_tokens 時自成一包
+
+    Returns:
+        list: 每包的項目 index
+    """
+    batches, batch, batch_tokens = [], [], 0
+    for i, n in enumerate(num_tokens):
+        if batch and (batch_tokens + n > max_tokens or len(batch) >= max_batch_size):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += n
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def build_batch_content(items: Sequence[str]) -> str:
+    """多篇文章以 [#1] [#2] ... 標號串接"""
+    return "\n".join(f"[#{i}] {item}" for i, item in enumerate(items, start=1))
+
+
+def demux_batch_response(response: str, num_items: int) -> List[Optional[str]]:
+    """依 [#編號] 拆回每篇文章的回覆，缺少或重複的編號為 None"""
+    parts = [None] * num_items
+    headers = list(_BATCH_ITEM_HEADER.finditer(response))
+    for i, header in enumerate(headers):
+        index = int(header.group(1)) - 1
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(response)
+        if not 0 <= index < num_items:
+            continue
+        content = response[header.end() : end].strip()
+        # 重複出現的編號無法判斷哪個正確
+        parts[index] = content if parts[index] is None else ""
+    return [part or None for part in parts]
@@ -0,0 +1,92 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .openai_utils import OpenAIAPIWrapper
+
+
+class BudgetExceededError(Exception):
+    pass
+
+
+class TokenBudget:
+    def __init__(
+        self,
+        api: OpenAIAPIWrapper,
+        max_cost: float,
+        model: str = "gpt-3.5-turbo",
+        currency: str = "USD",
+    ):
+        """花費上限；送出請求前先以預估 token 數預留額度，回覆後再以實際用量結算"""
+        self.api = api
+        self.max_cost = max_cost
+        self.model = model
+        self.currency = currency
+        self.reserved_tokens = 0
+        self.used_tokens = 0
+
+    def cost(self, num_tokens: int) -> float:
+        return self.api.price_counter(
+            num_tokens=num_tokens, model=self.model, currency=self.currency
+        )
+
+    @property
+    def spent(self) -> float:
+        return self.cost(self.used_tokens)
+
+    def reserve(self, num_tokens: int) -> None:
+        if self.cost(self.used_tokens + self.reserved_tokens + num_tokens) > self.max_cost:
+            raise BudgetExceededError(
+                f"budget {self.max_cost} {self.currency} reached, spent {self.spent:.4f}"
+            )
+        self.reserved_tokens += num_tokens
+
+    def release(self, num_tokens: int) -> None:
+        self.reserved_tokens -= num_tokens
+
+    def commit(self, reserved_tokens: int, used_tokens: int) -> None:
+        self.reserved_tokens -= reserved_tokens
+        self.used_tokens += used_tokens
+
+
+def plan_run(
+    api: OpenAIAPIWrapper,
+    messages_list: List[List[dict]],
+    model: str = "gpt-3.5-turbo",
+    expected_output_tokens: int = 256,
+    concurrency: int = 50,
+    requests_per_minute: int = 3500,
+    tokens_per_minute: int = 90000,
+    avg_latency: float = 10,
+    currency: str = "USD",
+    num_input_tokens: Optional[Sequence[int]] = None,
+) -> dict:
+    """送出前預估整批請求的 token 數、花費與所需時間
+
+    所需時間取 併發延遲、RPM、TPM 三者中最慢的瓶頸；
+    num_input_tokens 為已預先計算的每個請求 token 數，未指定時由 messages_list 計算
+    """
+    if num_input_tokens is None:
+        num_input_tokens = api.num_tokens_from_messages_batch(
+            messages_list=messages_list, model=model
+        )
+    num_input_tokens = np.asarray(num_input_tokens, dtype=np.int64)
+    num_requests = len(num_input_tokens)
+    input_tokens = int(num_input_tokens.sum())
+    output_tokens = num_requests * expected_output_tokens
+    total_tokens = input_tokens + output_tokens
+
+    seconds = max(
+        num_requests * avg_latency / concurrency,
+        num_requests / requests_per_minute * 60,
+        total_tokens / tokens_per_minute * 60,
+    )
+    return {
+        "num_requests": num_requests,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "max_input_tokens": int(num_input_tokens.max()) if num_requests else 0,
+        "cost": api.price_counter(num_tokens=total_tokens, model=model, currency=currency),
+        "currency": currency,
+        "estimated_seconds": seconds,
+    }
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+
+def make_cache_key(**kwargs) -> str:
+    """以參數內容 (model, messages, generation_params...) 的 sha256 作為 key"""
+    payload = json.dumps(kwargs, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str, max_size: int = 2 * 1024**3):
+        """以 SQLite 儲存 API 回覆，超過 max_size (bytes) 時依 LRU 淘汰"""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access ON cache (last_access)"
+        )
+        self._conn.commit()
+        self._total_size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE cache SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        value = json.dumps(value, ensure_ascii=False)
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._total_size += size - (old[0] if old else 0)
+            if self._total_size > self.max_size:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """刪除最久未使用的項目直到總大小低於 max_size"""
+        rows = self._conn.execute(
+            "SELECT key, size FROM cache ORDER BY last_access"
+        )
+        evict_keys = []
+        for key, size in rows:
+            if self._total_size <= self.max_size:
+                break
+            evict_keys.append((key,))
+            self._total_size -= size
+        self._conn.executemany("DELETE FROM cache WHERE key = ?", evict_keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            num_entries = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": num_entries,
+            "size": self._total_size,
+        }
+
+    def close(self) -> None:
+        self._conn.close()
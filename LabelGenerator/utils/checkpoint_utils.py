@@ -0,0 +1,46 @@
+import re
+from pathlib import Path
+from typing import Dict, List, Set
+
+from .data_utils import atomic_path, read_data, save_data
+
+
+class ShardedCheckpoint:
+    def __init__(self, output_dir: str, prefix: str, shard_size: int = 1000):
+        """將結果分批寫成 {prefix}-part-{n}.ndjson.gz，已寫入的 input_id 於重跑時略過
+
+        每個 shard 以暫存檔寫入後再 rename，中斷時最多只損失尚未寫出的一批
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self._shard_pattern = re.compile(
+            rf"^{re.escape(prefix)}-part-(\d+)\.ndjson\.gz$"
+        )
+
+    def shard_paths(self) -> List[Path]:
+        return sorted(
+            p for p in self.output_dir.iterdir() if self._shard_pattern.match(p.name)
+        )
+
+    def done_ids(self) -> Set[str]:
+        """讀取既有 shard 中已標記的 input_id"""
+        _done_ids = set()
+        for path in self.shard_paths():
+            _done_ids.update(read_data(path=str(path))["input_id"].astype(str))
+        return _done_ids
+
+    def _next_shard_index(self) -> int:
+        indices = [
+            int(self._shard_pattern.match(p.name).group(1)) for p in self.shard_paths()
+        ]
+        return max(indices) + 1 if indices else 0
+
+    def write_shard(self, data: Dict[str, list]) -> Path:
+        import pandas as pd
+
+        path = self.output_dir / f"{self.prefix}-part-{self._next_shard_index():05d}.ndjson.gz"
+        with atomic_path(path) as tmp_path:
+            save_data(data=pd.DataFrame(data), path=tmp_path)
+        return path
@@ -2,21 +2,31 @@ import json
 import logging
 import os
 import re
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any, List
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, List, Optional, Tuple
 
-import pandas as pd
-import yaml
+# pandas、yaml、fsspec 載入較慢，於實際讀寫時才 import
+if TYPE_CHECKING:
+    import pandas as pd
 
 # from KGBuilder.data_utils import split_sentence
 
 root_dir = Path(__name__).parent.absolute()
 
 
+_log_configured = False
+
+
 def log_setting(
     log_folder: str = "logs-default", log_level: int = logging.INFO, stream: bool = True
 ) -> None:
+    """設定 root logger 寫入 {log_folder}/{時間}.log，同一個 process 只設定一次"""
+    global _log_configured
+    if _log_configured:
+        return
+    _log_configured = True
     log_folder = log_folder if log_folder.startswith("logs-") else "logs-" + log_folder
     log_filename = os.path.join(
         Path(__file__).resolve().parent,
@@ -40,6 +50,8 @@ def log_setting(
 
 
 def read_data(path: str) -> Any:
+    if path.endswith((".csv", ".ndjson", ".ndjson.gz", ".pickle", ".parquet")):
+        import pandas as pd
     if path.endswith(".json"):
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
@@ -58,6 +70,8 @@ def read_data(path: str) -> Any:
     elif path.endswith(".parquet"):
         data = pd.read_parquet(path)
     elif path.endswith(".yaml"):
+        import yaml
+
         with open(path, "r") as stream:
             try:
                 data = yaml.safe_load(stream)
@@ -68,6 +82,64 @@ def read_data(path: str) -> Any:
     return data
 
 
+def read_data_batches(
+    path: str,
+    batch_size: int = 10000,
+    columns: Optional[List[str]] = None,
+    predicate: Optional[Callable[[dict], bool]] = None,
+) -> Iterator["pd.DataFrame"]:
+    """逐行串流讀取本地或 gs:// 的 .ndjson / .ndjson.gz，每 batch_size 筆產生一個 DataFrame
+
+    Args:
+        path (str): 檔案路徑，支援 fsspec 可開啟的路徑 (本地、gs://、memory:// ...)
+        batch_size (:obj:`int`, optional): 每批最多的筆數
+        columns (:obj:`list`, optional): 只保留這些欄位
+        predicate (:obj:`callable`, optional): 以原始 dict 判斷是否保留該筆，在建立 DataFrame 前過濾
+
+    Yields:
+        pd.DataFrame: 過濾、挑選欄位後的一批資料，全部被過濾時產生一個空的 DataFrame
+    """
+    import fsspec
+    import pandas as pd
+
+    records, num_batches = [], 0
+    with fsspec.open(path, "rt", encoding="utf-8", compression="infer") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if predicate is not None and not predicate(record):
+                continue
+            if columns is not None:
+                record = {k: record.get(k) for k in columns}
+            records.append(record)
+            if len(records) >= batch_size:
+                yield pd.DataFrame(records, columns=columns)
+                records, num_batches = [], num_batches + 1
+    if records or not num_batches:
+        yield pd.DataFrame(records, columns=columns)
+
+
+@contextmanager
+def atomic_path(path: str) -> Iterator[str]:
+    """回傳同目錄的暫存路徑 _tmp-{檔名}，區塊正常結束才 rename 成 path
+
+    讀取端 (下游、textfile collector、重跑時判斷已完成的輸出) 不會看到寫到一半的檔案；
+    區塊發生例外時刪除暫存檔，原本的 path 維持不變
+    """
+    path = str(path)
+    tmp_path = os.path.join(
+        os.path.dirname(os.path.abspath(path)), f"_tmp-{os.path.basename(path)}"
+    )
+    try:
+        yield tmp_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
 def save_data(data: Any, path: str) -> None:
     if path.endswith(".json"):
         with open(path, "w", encoding="utf-8") as f:
@@ -96,6 +168,95 @@ def save_data(data: Any, path: str) -> None:
         pass
 
 
+# 句末標點 (可接一個引號) 之後斷句，與原本先斷單字符句號、再斷「標點+引號」兩次取代的結果相同
+_SENTENCE_END_PATTERNS = {
+    "zh": r"[。？！…][”’\"']?",
+    "en": r"[.?!](?:[\"']|(?![”’]))",  # 英文只在直引號後斷句，彎引號前不斷
+    "all": r"[。？！….?!][”’\"']?",
+}
+# 與 str.splitlines 相同的換行字元，作為分隔符不計入句子
+_LINE_BREAKS = "\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]"
+_LINE_BREAK_REGEX = re.compile(_LINE_BREAKS)
+_SENTENCE_END_REGEX = {
+    flag: re.compile(pattern) for flag, pattern in _SENTENCE_END_PATTERNS.items()
+}
+# 合併的 pattern 掃描較慢，只在文本含換行時使用
+_SENTENCE_BOUNDARY_REGEX = {
+    flag: re.compile(f"(?P<end>{pattern})|(?P<sep>{_LINE_BREAKS})")
+    for flag, pattern in _SENTENCE_END_PATTERNS.items()
+}
+
+
+def split_sentence_spans(
+    document: str, flag: str = "all", mode: str = "sentence", limit: int = 510
+) -> List[Tuple[int, int]]:
+    """將文字段落根據標點符號分句，回傳每句 (或每段) 在 document 中的 (start, end)
+
+    一次掃描找出所有斷句位置，段落模式以位置合併相鄰句子，不重複串接字串
+
+    Args:
+        document (str): 要進行分句的文字段落
+        flag (:obj:`str`, optional): {"all", "zh", "en"}. "all": 中英文標點分句, "zh": 中文標點分句, "en": 英文標點分句   # noqa E501
+        mode (:obj:`str`, optional): {"sentence", "paragraph"}. "sentence": 超過 limit 的句子再切段, "paragraph": 合併相鄰句子直到長度達 limit
+        limit (:obj:`int`, optional): 預設單句最大長度為 510 個字符，可以透過這個此參數增減
+
+    Returns:
+        list: [(start, end), ...]，document[start:end] 即為該句，已去除頭尾空白
+    """
+    flag = flag if flag in _SENTENCE_END_PATTERNS else "all"
+    if _LINE_BREAK_REGEX.search(document):
+        regex = _SENTENCE_BOUNDARY_REGEX[flag]
+    else:
+        regex = _SENTENCE_END_REGEX[flag]
+    segments, start = [], 0
+    for match in regex.finditer(document):
+        end = match.start() if match.lastgroup == "sep" else match.end()
+        segments.append((start, end))
+        start = match.end()
+    segments.append((start, len(document)))
+
+    # 去除每句頭尾空白，並略過空句
+    stripped_segments = []
+    for start, end in segments:
+        while start < end and document[start].isspace():
+            start += 1
+        while end > start and document[end - 1].isspace():
+            end -= 1
+        if start < end:
+            stripped_segments.append((start, end))
+    segments = stripped_segments
+
+    spans = []
+    if mode == "sentence":
+        for start, end in segments:
+            while end - start > limit:
+                spans.append((start, start + limit))
+                start += limit
+            spans.append((start, end))
+
+    elif mode == "paragraph":
+        i = 0
+        while i < len(segments):
+            start, end = segments[i]
+            i += 1
+            while i < len(segments) and segments[i][1] - start < limit:
+                end = segments[i][1]
+                i += 1
+            spans.append((start, end))
+
+    return spans
+
+
+def split_sentence_spans_batch(
+    documents: Iterable[str], flag: str = "all", mode: str = "sentence", limit: int = 510
+) -> List[List[Tuple[int, int]]]:
+    """split_sentence_spans 的批次版本"""
+    return [
+        split_sentence_spans(document, flag=flag, mode=mode, limit=limit)
+        for document in documents
+    ]
+
+
 def split_sentence(
     document: str, flag: str = "all", mode: str = "sentence", limit: int = 510
 ) -> List[str]:
@@ -110,70 +271,7 @@ def split_sentence(
         list: 分句後的結果列表
 
     """
-    result_list = []
-    try:
-        if flag == "zh":
-            document = re.sub(
-                "(?P<quotation_mark>([。？！…](?![”’\"'])))",
-                r"\g<quotation_mark>\n",
-                document,
-            )  # 單字符斷句號
-            document = re.sub(
-                "(?P<quotation_mark>([。？！]|…{1,2})[”’\"'])",
-                r"\g<quotation_mark>\n",
-                document,
-            )  # 特殊引號
-        elif flag == "en":
-            document = re.sub(
-                "(?P<quotation_mark>([.?!](?![”’\"'])))",
-                r"\g<quotation_mark>\n",
-                document,
-            )  # 英文單字符斷句號
-            document = re.sub(
-                "(?P<quotation_mark>([?!.][\"']))", r"\g<quotation_mark>\n", document
-            )  # 特殊引號
-        else:
-            document = re.sub(
-                "(?P<quotation_mark>([。？！….?!](?![”’\"'])))",
-                r"\g<quotation_mark>\n",
-                document,
-            )  # 單字符斷句號
-            document = re.sub(
-                "(?P<quotation_mark>(([。？！.!?]|…{1,2})[”’\"']))",
-                r"\g<quotation_mark>\n",
-                document,
-            )  # 特殊引號
-
-        if mode == "sentence":
-            sent_list_ori = document.splitlines()
-            for sent in sent_list_ori:
-                sent = sent.strip()
-                if not sent:
-                    continue
-                else:
-                    while len(sent) > limit:
-                        temp = sent[0:limit]
-                        result_list.append(temp)
-                        sent = sent[limit:]
-                    result_list.append(sent)
-
-        elif mode == "paragraph":
-            sent_list_ori = document.splitlines()[::-1]
-            while sent_list_ori:
-                paragraph = sent_list_ori.pop().strip()
-                len_sent = len(sent_list_ori)
-                while sent_list_ori and len(paragraph + sent_list_ori[-1]) < limit:
-                    paragraph += sent_list_ori.pop().strip()
-                    if len(sent_list_ori) == len_sent:
-                        print(sent_list_ori)
-                        raise Exception("not reducing")
-                    else:
-                        len_sent = len(sent_list_ori)
-                result_list.append(paragraph)
-
-    except Exception as e:
-        print(f"Error: {e}")
-        result_list.clear()
-        result_list.append(document)
-
-    return result_list
+    return [
+        document[start:end]
+        for start, end in split_sentence_spans(document, flag=flag, mode=mode, limit=limit)
+    ]
@@ -0,0 +1,216 @@
+import json
+import os
+import re
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from .data_utils import atomic_path
+
+SIGNATURE_DTYPE = np.uint32
+_WHITESPACE = re.compile(r"\s+")
+_HASH_PRIME = np.uint64(0x100000001B3)
+
+
+def shingle_hashes(text: str, k: int = 5) -> np.ndarray:
+    """去除空白後每個字元 k-gram 的 64-bit 雜湊，中文不需斷詞
+
+    少於 k 字的文本整段視為一個 shingle
+    """
+    codes = np.frombuffer(
+        _WHITESPACE.sub("", text).encode("utf-32-le"), dtype=np.uint32
+    ).astype(np.uint64)
+    k = max(1, min(k, len(codes)))
+    n = max(1, len(codes) - k + 1)
+    hashes = np.zeros(n, dtype=np.uint64)
+    for j in range(min(k, len(codes))):
+        hashes = hashes * _HASH_PRIME + codes[j : j + n]
+    return hashes
+
+
+class MinHasher:
+    def __init__(
+        self,
+        num_perm: int = 128,
+        shingle_size: int = 5,
+        seed: int = 1,
+        max_chunk_shingles: int = 1 << 18,
+    ):
+        """以 multiply-shift 雜湊模擬 num_perm 個排列，計算字元 shingle 的 MinHash 簽章
+
+        max_chunk_shingles: 一次向量化計算的 shingle 數上限，控制暫存矩陣大小
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.max_chunk_shingles = max_chunk_shingles
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 2**64, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**64, size=num_perm, dtype=np.uint64)
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        """Returns: (len(texts), num_perm) 的 uint32 簽章"""
+        hashes = [shingle_hashes(text, self.shingle_size) for text in texts]
+        signatures = np.empty((len(texts), self.num_perm), dtype=SIGNATURE_DTYPE)
+        start = 0
+        while start < len(hashes):
+            # 累積到 max_chunk_shingles 個 shingle 為一批，至少一篇
+            end, total = start, 0
+            while end < len(hashes) and (
+                end == start or total + len(hashes[end]) <= self.max_chunk_shingles
+            ):
+                total += len(hashes[end])
+                end += 1
+            chunk = np.concatenate(hashes[start:end])
+            lengths = [len(h) for h in hashes[start:end]]
+            offsets = np.concatenate([[0], np.cumsum(lengths[:-1])])
+            # (num_perm, shingles) 讓 reduceat 沿連續記憶體計算，並以 in-place 運算減少暫存
+            permuted = self._a[:, None] * chunk
+            permuted += self._b[:, None]
+            permuted >>= np.uint64(32)
+            signatures[start:end] = np.minimum.reduceat(permuted, offsets, axis=1).T
+            start = end
+        return signatures
+
+
+class NearDuplicateIndex:
+    def __init__(
+        self,
+        num_perm: int = 128,
+        bands: int = 16,
+        threshold: float = 0.8,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ):
+        """MinHash + LSH 近似重複索引，只收錄標準版本 (canonical)
+
+        簽章切成 bands 段，任一段完全相同即為候選，再以簽章相同比例估計的
+        Jaccard 相似度 >= threshold 判定為重複
+        """
+        if num_perm % bands:
+            raise ValueError(
+                f"num_perm ({num_perm}) must be divisible by bands ({bands})"
+            )
+        self.num_perm = num_perm
+        self.bands = bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size, seed=seed)
+        self.ids: List[str] = []
+        self.signatures = np.zeros((0, num_perm), dtype=SIGNATURE_DTYPE)
+        self._id_index = {}
+        self._rebuild()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """每段簽章折成一個 uint64，回傳 (n, bands)"""
+        rows = signatures.reshape(
+            len(signatures), self.bands, self.num_perm // self.bands
+        ).astype(np.uint64)
+        keys = np.zeros(rows.shape[:2], dtype=np.uint64)
+        for r in range(rows.shape[2]):
+            keys = keys * _HASH_PRIME + rows[:, :, r]
+        return keys
+
+    def _rebuild(self) -> None:
+        # 每段各自排序，查詢時以 searchsorted 找出相同 key 的範圍
+        band_keys = self._band_keys(self.signatures)
+        self._order = np.argsort(band_keys, axis=0, kind="stable")
+        self._sorted_keys = np.take_along_axis(band_keys, self._order, axis=0)
+
+    def deduplicate(
+        self, ids: Sequence[str], texts: Sequence[str], update: bool = True
+    ) -> Dict[str, str]:
+        """依序比對 texts 與索引 (含同批較前面的文章)，非重複者加入索引
+
+        已在索引中的 id 視為標準版本，重跑同一批不會被判為自己的重複；
+        update=False 時只比對，索引維持不變
+
+        Returns:
+            dict: {重複文章 id: 標準版本 id}
+        """
+        ids = [str(i) for i in ids]
+        signatures = self.hasher.signatures(texts)
+        band_keys = self._band_keys(signatures)
+        lo, hi = (
+            np.stack(
+                [
+                    np.searchsorted(self._sorted_keys[:, b], band_keys[:, b], side=side)
+                    for b in range(self.bands)
+                ],
+                axis=1,
+            )
+            for side in ("left", "right")
+        )
+
+        duplicates, new_rows, batch_buckets = {}, [], {}
+        for j, _id in enumerate(ids):
+            if _id in self._id_index:
+                continue
+            candidates = {
+                int(self._order[i, b])
+                for b in np.flatnonzero(hi[j] > lo[j])
+                for i in range(lo[j, b], hi[j, b])
+            }
+            batch_candidates = {
+                k
+                for b, key in enumerate(band_keys[j])
+                for k in batch_buckets.get((b, key), [])
+            }
+            best_id, best_score = None, self.threshold
+            for row in candidates:
+                score = float(np.mean(self.signatures[row] == signatures[j]))
+                if score >= best_score:
+                    best_id, best_score = self.ids[row], score
+            for k in batch_candidates:
+                score = float(np.mean(signatures[k] == signatures[j]))
+                if score >= best_score:
+                    best_id, best_score = ids[k], score
+            if best_id is not None:
+                duplicates[_id] = best_id
+                continue
+            new_rows.append(j)
+            if update:
+                self._id_index[_id] = len(self.ids) + len(new_rows) - 1
+            for b, key in enumerate(band_keys[j]):
+                batch_buckets.setdefault((b, key), []).append(j)
+
+        if update and new_rows:
+            self.ids.extend(ids[j] for j in new_rows)
+            self.signatures = np.concatenate([self.signatures, signatures[new_rows]])
+            self._rebuild()
+        return duplicates
+
+    def save(self, path_prefix: str) -> None:
+        """寫成 {path_prefix}.signatures.npy / .ids.npy / .json，各檔以 atomic_path 寫入"""
+        os.makedirs(os.path.dirname(os.path.abspath(path_prefix)), exist_ok=True)
+        params = {
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "threshold": self.threshold,
+            "shingle_size": self.shingle_size,
+            "seed": self.seed,
+        }
+        for suffix, save in [
+            (".signatures.npy", lambda f: np.save(f, self.signatures)),
+            (".ids.npy", lambda f: np.save(f, np.asarray(self.ids, dtype=str))),
+            (".json", lambda f: f.write(json.dumps(params).encode("utf-8"))),
+        ]:
+            with atomic_path(f"{path_prefix}{suffix}") as tmp_path:
+                with open(tmp_path, "wb") as f:
+                    save(f)
+
+    @classmethod
+    def load(cls, path_prefix: str, **kwargs) -> "NearDuplicateIndex":
+        """讀取 save 的輸出，檔案不存在時以 kwargs 建立空索引"""
+        if not os.path.exists(f"{path_prefix}.json"):
+            return cls(**kwargs)
+        with open(f"{path_prefix}.json", encoding="utf-8") as f:
+            index = cls(**json.load(f))
+        index.signatures = np.load(f"{path_prefix}.signatures.npy")
+        index.ids = np.load(f"{path_prefix}.ids.npy").tolist()
+        index._id_index = {_id: i for i, _id in enumerate(index.ids)}
+        index._rebuild()
+        return index
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+from array import array
+from contextlib import ExitStack
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from .data_utils import atomic_path
+from .tag_utils import OFFSET_DTYPE, TAG_DTYPE
+
+TOKEN_DTYPE = np.uint32  # 以字元的 Unicode code point 作為 token
+SPLITS = ("train", "dev", "test")
+
+
+def split_bucket(
+    key: str,
+    ratios: Sequence[float] = (0.7, 0.2, 0.1),
+    names: Sequence[str] = SPLITS,
+    salt: str = "",
+) -> str:
+    """依 key 的雜湊決定所屬切分
+
+    與資料順序、總筆數無關，重跑或新增資料時既有的 key 不會換到其他切分；
+    同一篇文章的各段使用相同 key (input_id)，不會同時出現在 train 與 test
+    """
+    digest = hashlib.blake2b(f"{salt}{key}".encode("utf-8"), digest_size=8).digest()
+    position = int.from_bytes(digest, "big") / 2**64 * sum(ratios)
+    bound = 0.0
+    for name, ratio in zip(names, ratios):
+        bound += ratio
+        if position < bound:
+            return name
+    return names[-1]
+
+
+class TokenShardWriter:
+    def __init__(self, path_prefix: str, id2tag: Sequence[str]):
+        """逐筆附加寫入可 memory-map 的 token/標記檔，不在記憶體中累積資料
+
+        - {path_prefix}.tokens.bin: 所有字元的 code point (uint32) 串接
+        - {path_prefix}.tags.bin: 對應的標記 id (uint8) 串接
+        - {path_prefix}.offsets.npy: 第 i 筆位於 [offsets[i], offsets[i + 1])
+        - {path_prefix}.ids.txt / .json: 每筆的 input_id 與 dtype、標記表等資訊
+
+        先寫暫存檔，close 時才 rename，中斷時不會留下不完整的輸出
+        """
+        self.path_prefix = path_prefix
+        self.id2tag = list(id2tag)
+        Path(path_prefix).parent.mkdir(parents=True, exist_ok=True)
+        self._paths = [
+            f"{path_prefix}{suffix}"
+            for suffix in (".tokens.bin", ".tags.bin", ".ids.txt", ".offsets.npy", ".json")
+        ]
+        # close 時離開各 atomic_path，暫存檔才 rename 成輸出
+        self._outputs = ExitStack()
+        self._tmp_paths = [self._outputs.enter_context(atomic_path(p)) for p in self._paths]
+        self._tokens = open(self._tmp_paths[0], "wb")
+        self._tags = open(self._tmp_paths[1], "wb")
+        self._ids = open(self._tmp_paths[2], "w", encoding="utf-8")
+        self._lengths = array("q")
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def write(self, input_id: str, text: str, tags: np.ndarray) -> None:
+        tokens = np.frombuffer(text.encode("utf-32-le"), dtype=TOKEN_DTYPE)
+        if len(tokens) != len(tags):
+            raise ValueError(
+                f"{input_id}: {len(tokens)} characters but {len(tags)} tags"
+            )
+        self._tokens.write(tokens.tobytes())
+        self._tags.write(np.asarray(tags, dtype=TAG_DTYPE).tobytes())
+        self._ids.write(f"{input_id}\n")
+        self._lengths.append(len(tokens))
+
+    def close(self) -> None:
+        for f in (self._tokens, self._tags, self._ids):
+            f.close()
+        offsets = np.zeros(len(self._lengths) + 1, dtype=OFFSET_DTYPE)
+        np.cumsum(np.frombuffer(self._lengths, dtype=np.int64), out=offsets[1:])
+        np.save(self._tmp_paths[3], offsets)
+        meta = {
+            "num_rows": len(self._lengths),
+            "num_tokens": int(offsets[-1]),
+            "token_dtype": np.dtype(TOKEN_DTYPE).name,
+            "tag_dtype": np.dtype(TAG_DTYPE).name,
+            "id2tag": self.id2tag,
+        }
+        with open(self._tmp_paths[4], "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        self._outputs.close()
+
+
+class TokenShard:
+    def __init__(self, path_prefix: str):
+        """讀取 TokenShardWriter 的輸出，token 與標記皆 memory-map，可隨機存取任一筆"""
+        with open(f"{path_prefix}.json", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.id2tag = self.meta["id2tag"]
+        self.offsets = np.load(f"{path_prefix}.offsets.npy", mmap_mode="r")
+        self.tokens = self._memmap(f"{path_prefix}.tokens.bin", TOKEN_DTYPE)
+        self.tags = self._memmap(f"{path_prefix}.tags.bin", TAG_DTYPE)
+
+    @staticmethod
+    def _memmap(path: str, dtype) -> np.ndarray:
+        # 空檔案無法 memory-map
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns: (token code points, 標記 id)"""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.tokens[start:end], self.tags[start:end]
+
+    def text(self, i: int) -> str:
+        tokens, _ = self[i]
+        return np.ascontiguousarray(tokens, dtype=TOKEN_DTYPE).tobytes().decode("utf-32-le")
+
+    def tag_strings(self, i: int) -> List[str]:
+        _, tags = self[i]
+        return [self.id2tag[t] for t in tags.tolist()]
+
+
+class SplitWriter:
+    def __init__(self, output_dir: str, id2tag: Sequence[str]):
+        """一個切分 (train/dev/test) 的輸出：seq.in/seq.out 文字檔與 data.* token/標記檔
+
+        seq.in 每行為以空白分隔的字元，seq.out 為對應的 BIOES 標記
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.id2tag = list(id2tag)
+        self._seq_paths = [str(self.output_dir / "seq.in"), str(self.output_dir / "seq.out")]
+        self._outputs = ExitStack()
+        self._seq_in, self._seq_out = (
+            open(self._outputs.enter_context(atomic_path(path)), "w", encoding="utf-8")
+            for path in self._seq_paths
+        )
+        self.shard_writer = TokenShardWriter(str(self.output_dir / "data"), self.id2tag)
+
+    def __len__(self):
+        return len(self.shard_writer)
+
+    def write(self, input_id: str, text: str, tags: np.ndarray) -> None:
+        self.shard_writer.write(input_id, text, tags)
+        self._seq_in.write(" ".join(text) + "\n")
+        self._seq_out.write(" ".join([self.id2tag[t] for t in tags.tolist()]) + "\n")
+
+    def close(self) -> None:
+        self._seq_in.close()
+        self._seq_out.close()
+        self._outputs.close()
+        self.shard_writer.close()
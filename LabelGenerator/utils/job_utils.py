@@ -0,0 +1,53 @@
+import json
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .data_utils import atomic_path
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def date_range(start: str, end: str) -> List[str]:
+    """["YYYYMMDD", ...]，包含 start 與 end"""
+    start_date = datetime.strptime(start, "%Y%m%d")
+    end_date = datetime.strptime(end, "%Y%m%d")
+    return [
+        (start_date + timedelta(days=i)).strftime("%Y%m%d")
+        for i in range((end_date - start_date).days + 1)
+    ]
+
+
+class JobState:
+    def __init__(self, path: str):
+        """以 json 檔記錄每個工作 (日期) 的狀態與統計，每次更新都先寫暫存檔再 rename
+
+        上次中斷時仍為 running 的工作視為 pending
+        """
+        self.path = Path(path)
+        self.jobs: Dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                self.jobs = json.load(f)
+        for job in self.jobs.values():
+            if job["status"] == JOB_RUNNING:
+                job["status"] = JOB_PENDING
+
+    def status(self, key: str) -> str:
+        return self.jobs.get(key, {}).get("status", JOB_PENDING)
+
+    def update(self, key: str, status: Optional[str] = None, **info) -> None:
+        job = self.jobs.setdefault(key, {"status": JOB_PENDING})
+        if status is not None:
+            job["status"] = status
+        job.update(info, updated_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+        self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_path(self.path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.jobs, f, ensure_ascii=False, indent=2)
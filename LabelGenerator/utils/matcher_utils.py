@@ -0,0 +1,77 @@
+import re
+from typing import Dict, List, Tuple
+
+try:
+    import ahocorasick  # pyahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class EntityMatcher:
+    def __init__(self, entities: Dict[str, List[str]]):
+        """以所有類別的實體字串建立單一 automaton
+
+        未安裝 pyahocorasick 時改用單一 regex alternation (長字串在前)，結果相同
+
+        同一字串出現在多個類別時，以 entities 中先出現的類別為準
+
+        Args:
+            entities (dict): {實體類別: [實體字串, ...]}
+        """
+        self._types = {}
+        for ent_type, ent_list in entities.items():
+            for word in ent_list:
+                if word and word not in self._types:
+                    self._types[word] = ent_type
+        self._empty = not self._types
+        self._automaton = self._pattern = None
+        if self._empty:
+            return
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for word, ent_type in self._types.items():
+                self._automaton.add_word(word, (len(word), ent_type))
+            self._automaton.make_automaton()
+        else:
+            # 同一起點 regex 取第一個符合的選項，長字串在前即為最左最長
+            self._pattern = re.compile(
+                "|".join(re.escape(w) for w in sorted(self._types, key=len, reverse=True))
+            )
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """一次掃描找出不重疊、最左最長的實體位置
+
+        Returns:
+            list: [(start, end, 實體類別), ...]，依 start 排序
+        """
+        if self._empty:
+            return []
+        if self._pattern is not None:
+            return [
+                (m.start(), m.end(), self._types[m.group()])
+                for m in self._pattern.finditer(text)
+            ]
+        matches = sorted(
+            (end + 1 - length, end + 1, ent_type)
+            for end, (length, ent_type) in self._automaton.iter(text)
+        )
+        spans, last_end, i = [], 0, 0
+        while i < len(matches):
+            # 同一起點取最長者
+            start = matches[i][0]
+            longest = matches[i]
+            while i < len(matches) and matches[i][0] == start:
+                if matches[i][1] > longest[1]:
+                    longest = matches[i]
+                i += 1
+            if start >= last_end:
+                spans.append(longest)
+                last_end = longest[1]
+        return spans
+
+    def find_offsets(self, text: str) -> Dict[str, List[Tuple[int, int]]]:
+        """與 find 相同，但依實體類別分組: {實體類別: [(start, end), ...]}"""
+        offsets = {}
+        for start, end, ent_type in self.find(text):
+            offsets.setdefault(ent_type, []).append((start, end))
+        return offsets
@@ -0,0 +1,125 @@
+import json
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from typing import Tuple
+
+import numpy as np
+
+from .data_utils import atomic_path
+
+
+def _format_key(key: Tuple[str, tuple]) -> str:
+    """("api_latency", (("model", "gpt-4"),)) -> 'api_latency{model="gpt-4"}'"""
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Metrics:
+    def __init__(self, window: int = 10000):
+        """各階段耗時與計數，可合併其他 process 的 snapshot，輸出 json 或 Prometheus textfile
+
+        計時保留最近 window 筆樣本計算 p50/p95/p99，次數與總和則完整累計
+        """
+        self.window = window
+        self.start_time = time.time()
+        self.counters = Counter()
+        self._timer_counts = Counter()
+        self._timer_sums = Counter()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def incr(self, name: str, value: float = 1, **labels) -> None:
+        self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self._timer_counts[key] += 1
+        self._timer_sums[key] += seconds
+        self._samples[key].append(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        """可 pickle 的內容，用於從 worker process 傳回主程序 merge"""
+        return {
+            "counters": dict(self.counters),
+            "timers": {
+                key: (self._timer_counts[key], self._timer_sums[key], list(samples))
+                for key, samples in self._samples.items()
+            },
+        }
+
+    def merge(self, snapshot: dict) -> "Metrics":
+        self.counters.update(snapshot["counters"])
+        for key, (count, total, samples) in snapshot["timers"].items():
+            self._timer_counts[key] += count
+            self._timer_sums[key] += total
+            self._samples[key].extend(samples)
+        return self
+
+    def summary(self) -> dict:
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        timers = {}
+        for key, samples in self._samples.items():
+            p50, p95, p99 = np.percentile(np.fromiter(samples, dtype=float), [50, 95, 99])
+            timers[_format_key(key)] = {
+                "count": self._timer_counts[key],
+                "total": round(self._timer_sums[key], 6),
+                "p50": round(float(p50), 6),
+                "p95": round(float(p95), 6),
+                "p99": round(float(p99), 6),
+            }
+        return {
+            "elapsed": round(elapsed, 3),
+            "counters": {_format_key(key): value for key, value in self.counters.items()},
+            "throughput": {
+                _format_key(key): round(value / elapsed, 3)
+                for key, value in self.counters.items()
+            },
+            "timers": timers,
+        }
+
+    def write_json(self, path: str) -> None:
+        _atomic_write(path, json.dumps(self.summary(), ensure_ascii=False, indent=2))
+
+    def write_prometheus(self, path: str, prefix: str = "label_generator") -> None:
+        """node_exporter textfile collector 格式：計數為 counter，計時為 summary"""
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for key, value in self.counters.items():
+                if key[0] == name:
+                    lines.append(f"{_format_key((metric, key[1]))} {value}")
+        for name in sorted({name for name, _ in self._samples}):
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for key, samples in self._samples.items():
+                if key[0] != name:
+                    continue
+                quantiles = np.percentile(np.fromiter(samples, dtype=float), [50, 95, 99])
+                for q, value in zip(("0.5", "0.95", "0.99"), quantiles):
+                    lines.append(
+                        f"{_format_key((metric, key[1] + (('quantile', q),)))} {value:.6f}"
+                    )
+                lines.append(
+                    f"{_format_key((metric + '_sum', key[1]))} {self._timer_sums[key]:.6f}"
+                )
+                lines.append(
+                    f"{_format_key((metric + '_count', key[1]))} {self._timer_counts[key]}"
+                )
+        _atomic_write(path, "\n".join(lines) + "\n")
+
+
+def _atomic_write(path: str, content: str) -> None:
+    # textfile collector 可能在寫入途中讀取
+    with atomic_path(path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
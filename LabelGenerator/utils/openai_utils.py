@@ -1,37 +1,213 @@
+import base64
 import logging
+import random
+from functools import lru_cache
 from pathlib import Path
-from time import sleep
+from typing import Iterator, List, Sequence, Tuple
 
-import openai
-import tiktoken
+import numpy as np
+
+from .batching_utils import pack_batches
+from .cache_utils import ResponseCache, make_cache_key
+from .metrics_utils import Metrics
+from .transport_utils import CircuitBreaker, RetryPolicy, Transport
 
 root_dir = Path(__name__).parent.absolute()
 
+EMBEDDING_DTYPE = np.float32
+
+
+@lru_cache(maxsize=None)
+def _resolve_encoding(model: str):
+    # tiktoken 只在需要計算 token 數時才載入
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        logging.info("Warning: model not found. Using cl100k_base encoding.")
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=None)
+def _resolve_token_counting(model: str):
+    """回傳 (encoding, tokens_per_message, tokens_per_name)，每個 model 只解析一次"""
+    if model == "gpt-3.5-turbo":
+        logging.info(
+            "Warning: gpt-3.5-turbo may change over time. Returning num tokens assuming gpt-3.5-turbo-0301."
+        )
+        return _resolve_token_counting("gpt-3.5-turbo-0301")
+    elif model == "gpt-4":
+        logging.info(
+            "Warning: gpt-4 may change over time. Returning num tokens assuming gpt-4-0314."
+        )
+        return _resolve_token_counting("gpt-4-0314")
+    elif model == "gpt-3.5-turbo-0301":
+        tokens_per_message = (
+            4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
+        )
+        tokens_per_name = -1  # if there's a name, the role is omitted
+    elif model == "gpt-4-0314":
+        tokens_per_message = 3
+        tokens_per_name = 1
+    else:
+        raise NotImplementedError(
+            f"""num_tokens_from_messages() is not implemented for model {model}."""
+        )
+    return _resolve_encoding(model), tokens_per_message, tokens_per_name
+
+
+def _decode_embeddings(data: list) -> np.ndarray:
+    """回覆中的 embedding 依 index 排序後轉成 float32 矩陣，支援 base64 與 list 格式"""
+    data = sorted(data, key=lambda d: d["index"])
+    return np.stack(
+        [
+            np.frombuffer(base64.b64decode(d["embedding"]), dtype=EMBEDDING_DTYPE)
+            if isinstance(d["embedding"], str)
+            else np.asarray(d["embedding"], dtype=EMBEDDING_DTYPE)
+            for d in data
+        ]
+    )
+
 
 class OpenAIAPIWrapper:
-    def __init__(self, API_KEY: str):
-        """初始化並驗證身份"""
+    def __init__(
+        self,
+        API_KEY: str,
+        api_base: str = None,
+        cache_path: str = None,
+        cache_max_size: int = 2 * 1024**3,
+        timeout: float = 60,
+        max_retries: int = 8,
+        pool_size: int = 100,
+        metrics: Metrics = None,
+        log_sample_rate: float = 0.0,
+    ):
+        """初始化並驗證身份
+
+        api_base: 可指向本地的假 completion server 做測試
+        cache_path: 指定後以 SQLite 快取相同 model/輸入/generation_params 的回覆
+        timeout / max_retries: 單次請求逾時秒數與可重試錯誤 (429/5xx/逾時) 的重試次數
+        pool_size: async 請求共用連線池的連線數上限
+        metrics: API 延遲、重試、快取命中等計數，與 pipeline 其他階段共用時傳入
+        log_sample_rate: 以此比例抽樣記錄完整的 prompt 與回覆，預設不記錄
+        """
+        # openai 套件載入約需半秒，建立 wrapper 時才 import
+        import openai
+
         self._openai = openai
         self._openai.api_key = API_KEY
+        if api_base:
+            self._openai.api_base = api_base
+        self.metrics = metrics or Metrics()
+        self.log_sample_rate = log_sample_rate
+        # openai 套件每個請求都會記一行 INFO log
+        logging.getLogger("openai").setLevel(logging.WARNING)
+        self.transport = Transport(
+            timeout=timeout,
+            pool_size=pool_size,
+            retry_policy=RetryPolicy(max_retries=max_retries),
+            circuit_breaker=CircuitBreaker(),
+            metrics=self.metrics,
+        )
+        self.cache = (
+            ResponseCache(path=cache_path, max_size=cache_max_size)
+            if cache_path
+            else None
+        )
+
+    def _cache_get(self, **kwargs):
+        if self.cache is None:
+            return None, None
+        key = make_cache_key(**kwargs)
+        value = self.cache.get(key)
+        self.metrics.incr(
+            "cache_misses" if value is None else "cache_hits", endpoint=kwargs["endpoint"]
+        )
+        return key, value
+
+    def _log_sampled(self, reply: str, **request) -> None:
+        # 完整 prompt 與回覆的 I/O 成本高，只抽樣記錄，未抽中時也不組字串
+        if self.log_sample_rate and random.random() < self.log_sample_rate:
+            logging.info(
+                "".join(f"\n{k}: {v}" for k, v in request.items()) + f"\nReply: {reply}\n"
+            )
+
+    def _cache_set(self, key, value):
+        if self.cache is not None:
+            self.cache.set(key, value)
 
     def get_embeddings(self, text, model="text-embedding-ada-002"):
         """免費帳戶有時間內之取用上限"""
         self._model = model
         self._text = text.replace("\n", " ")
 
-        success = False
-        while not success:
-            try:
-                res = self._openai.Embedding.create(input=[text], model=model)["data"][
-                    0
-                ]["embedding"]
-                success = True
-
-            except Exception as e:
-                logging.error(e)
-                sleep(60)
+        key, res = self._cache_get(endpoint="embeddings", model=model, input=self._text)
+        if res is not None:
+            return res
+
+        res = self.transport.call(
+            self._openai.Embedding.create, input=[self._text], model=model
+        )["data"][0]["embedding"]
+        self._cache_set(key, res)
         return res
 
+    def iter_embeddings_batch(
+        self,
+        texts: Sequence[str],
+        model: str = "text-embedding-ada-002",
+        max_batch_tokens: int = 8000,
+        max_batch_size: int = 2048,
+        max_input_tokens: int = 8191,
+        chunk_size: int = 10000,
+    ) -> Iterator[Tuple[List[int], np.ndarray]]:
+        """多段文本依 token 數打包成一次請求，依序產生 (texts 中的 index, float32 矩陣)
+
+        超過 max_input_tokens 的文本會被截斷；每次只對 chunk_size 筆編碼，
+        回覆以 base64 取回直接轉成 numpy，不經過 Python float list，也不寫入回覆快取
+
+        Args:
+            max_batch_tokens (int): 每次請求的 token 總數上限
+            max_batch_size (int): 每次請求的文本數上限
+        """
+        encoding = _resolve_encoding(model)
+        for chunk_start in range(0, len(texts), chunk_size):
+            chunk = [
+                text.replace("\n", " ")
+                for text in texts[chunk_start : chunk_start + chunk_size]
+            ]
+            tokens = encoding.encode_batch(chunk)
+            for i, _tokens in enumerate(tokens):
+                if len(_tokens) > max_input_tokens:
+                    chunk[i] = encoding.decode(_tokens[:max_input_tokens])
+            batches = pack_batches(
+                [min(len(t), max_input_tokens) for t in tokens],
+                max_tokens=max_batch_tokens,
+                max_batch_size=max_batch_size,
+            )
+            for batch in batches:
+                response = self.transport.call(
+                    self._openai.Embedding.create,
+                    input=[chunk[i] for i in batch],
+                    model=model,
+                    encoding_format="base64",
+                )
+                yield [chunk_start + i for i in batch], _decode_embeddings(
+                    response["data"]
+                )
+
+    def get_embeddings_batch(
+        self, texts: Sequence[str], model: str = "text-embedding-ada-002", **kwargs
+    ) -> np.ndarray:
+        """iter_embeddings_batch 的結果組成 (len(texts), dim) 矩陣，大量資料請改用
+        vector_utils.embed_to_store 寫入 memory-mapped 檔案"""
+        embeddings = None
+        for indices, vectors in self.iter_embeddings_batch(texts, model=model, **kwargs):
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=EMBEDDING_DTYPE)
+            embeddings[indices] = vectors
+        return embeddings if embeddings is not None else np.zeros((0, 0), EMBEDDING_DTYPE)
+
     def get_text_completion(
         self, prompt, model="text-davinci-003", generation_params=None
     ):
@@ -45,12 +221,24 @@ class OpenAIAPIWrapper:
 
         if not generation_params:
             generation_params = {"temperature": 0.7, "max_tokens": 1024}
-        logging.info(f"\nPrompt: {prompt}\nWith params: {generation_params}")
-        response = self._openai.Completion.create(
-            model=model, prompt=prompt, **generation_params
+        key, res = self._cache_get(
+            endpoint="completions",
+            model=model,
+            prompt=prompt,
+            generation_params=generation_params,
+        )
+        if res is not None:
+            return res
+
+        response = self.transport.call(
+            self._openai.Completion.create,
+            model=model,
+            prompt=prompt,
+            **generation_params,
         )
         res = response["choices"][0]["text"].strip()
-        logging.info(f"\nGPT-3 Reply: {res}\n")
+        self._log_sampled(res, prompt=prompt, generation_params=generation_params)
+        self._cache_set(key, res)
         return res
 
     def get_chat_completion(
@@ -81,46 +269,63 @@ class OpenAIAPIWrapper:
 
         if not generation_params:
             generation_params = {"temperature": 0.7, "max_tokens": 1024}
-        logging.info(f"\nMessages: {messages}\nWith params: {generation_params}")
+        key, res = self._cache_get(
+            endpoint="chat",
+            model=model,
+            messages=messages,
+            generation_params=generation_params,
+        )
+        if res is not None:
+            return res
 
-        response = self._openai.ChatCompletion.create(
-            model=model, messages=messages, **generation_params
+        response = self.transport.call(
+            self._openai.ChatCompletion.create,
+            model=model,
+            messages=messages,
+            **generation_params,
         )
         res = response["choices"][0]["message"]["content"].strip()
-        logging.info(f"\nChatGPT Reply: {res}\n")
+        self._log_sampled(res, messages=messages, generation_params=generation_params)
+        self._cache_set(key, res)
+        return res
+
+    async def aget_chat_completion(
+        self,
+        messages,
+        model="gpt-3.5-turbo",
+        generation_params=None,
+        before_request=None,
+    ):
+        """get_chat_completion 的 asyncio 版本，參數相同
+
+        before_request: 快取未命中、每次實際送出 (含重試) 前會 await 的函式 (例如 rate limiter)
+        """
+        if not generation_params:
+            generation_params = {"temperature": 0.7, "max_tokens": 1024}
+        key, res = self._cache_get(
+            endpoint="chat",
+            model=model,
+            messages=messages,
+            generation_params=generation_params,
+        )
+        if res is not None:
+            return res
+
+        response = await self.transport.acall(
+            self._openai.ChatCompletion.acreate,
+            before_attempt=before_request,
+            model=model,
+            messages=messages,
+            **generation_params,
+        )
+        res = response["choices"][0]["message"]["content"].strip()
+        self._log_sampled(res, messages=messages, generation_params=generation_params)
+        self._cache_set(key, res)
         return res
 
     def num_tokens_from_messages(self, messages: list, model: str = "gpt-3.5-turbo"):
         """Returns the number of tokens used by a list of messages or texts."""
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            logging.info("Warning: model not found. Using cl100k_base encoding.")
-            encoding = tiktoken.get_encoding("cl100k_base")
-        if model == "gpt-3.5-turbo":
-            logging.info(
-                "Warning: gpt-3.5-turbo may change over time. Returning num tokens assuming gpt-3.5-turbo-0301."
-            )
-            return self.num_tokens_from_messages(
-                messages=messages, model="gpt-3.5-turbo-0301"
-            )
-        elif model == "gpt-4":
-            logging.info(
-                "Warning: gpt-4 may change over time. Returning num tokens assuming gpt-4-0314."
-            )
-            return self.num_tokens_from_messages(messages=messages, model="gpt-4-0314")
-        elif model == "gpt-3.5-turbo-0301":
-            tokens_per_message = (
-                4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
-            )
-            tokens_per_name = -1  # if there's a name, the role is omitted
-        elif model == "gpt-4-0314":
-            tokens_per_message = 3
-            tokens_per_name = 1
-        else:
-            raise NotImplementedError(
-                f"""num_tokens_from_messages() is not implemented for model {model}."""
-            )
+        encoding, tokens_per_message, tokens_per_name = _resolve_token_counting(model)
 
         num_tokens = 0
         for message in messages:
@@ -132,6 +337,36 @@ class OpenAIAPIWrapper:
         num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
         return num_tokens
 
+    def num_tokens_from_messages_batch(
+        self, messages_list: List[list], model: str = "gpt-3.5-turbo", num_threads: int = 8
+    ) -> List[int]:
+        """num_tokens_from_messages 的批次版本，以 encode_batch 多執行緒一次編碼所有內容"""
+        encoding, tokens_per_message, tokens_per_name = _resolve_token_counting(model)
+
+        texts, owners = [], []
+        num_tokens = []
+        for i, messages in enumerate(messages_list):
+            _num_tokens = 3  # every reply is primed with <|start|>assistant<|message|>
+            for message in messages:
+                _num_tokens += tokens_per_message
+                for key, value in message.items():
+                    texts.append(value)
+                    owners.append(i)
+                    if key == "name":
+                        _num_tokens += tokens_per_name
+            num_tokens.append(_num_tokens)
+
+        for i, tokens in zip(owners, encoding.encode_batch(texts, num_threads=num_threads)):
+            num_tokens[i] += len(tokens)
+        return num_tokens
+
+    def num_tokens_batch(
+        self, texts: List[str], model: str = "gpt-3.5-turbo", num_threads: int = 8
+    ) -> List[int]:
+        """各段文字本身的 token 數 (不含訊息格式的額外 token)"""
+        encoding, _, _ = _resolve_token_counting(model)
+        return [len(tokens) for tokens in encoding.encode_batch(texts, num_threads=num_threads)]
+
     def price_counter(
         self, num_tokens: int, model: str = "gpt-3.5-turbo", currency: str = "USD"
     ):
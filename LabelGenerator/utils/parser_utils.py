@@ -0,0 +1,114 @@
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+# 解析結果的原因碼
+PARSE_OK = "ok"
+PARSE_PARTIAL = "partial"  # 部分類別缺漏，缺的類別視為無實體
+PARSE_EMPTY = "empty"
+PARSE_INVALID_JSON = "invalid_json"
+PARSE_NO_CATEGORY = "no_category"
+PARSE_AMBIGUOUS = "ambiguous"  # 分類任務回覆中出現多個類別
+
+_JSON_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_VALUE_SPLITTER = re.compile(r"[,，、;；\n]+")
+# 值前的條列符號或編號 (與類別行首相同，"3.5吋" 這類小數不視為編號)；
+# 行首編號先於切分前去除，避免 "1、台積電" 被 "、" 切出 "1"
+_LINE_NUMBER = re.compile(r"^([ \t]*(?:[-*•·]+[ \t]*)?)\d+[.)、](?!\d)", re.MULTILINE)
+_VALUE_STRIP = re.compile(r"^[\s\-*•·]*(?:\d+[.)、](?!\d)\s*)?|[\s。]+$")
+
+
+class EntityOutputParser:
+    def __init__(
+        self,
+        entity_types: List[str],
+        empty_values: Tuple[str, ...] = ("無", "无", "none", "n/a", "null", "nan"),
+    ):
+        """解析 OpenAI 列出的實體，容許全形冒號、條列符號、粗體與 JSON 等格式變化
+
+        類別名稱可寫成完整的 "組織(ORGANIZATION)"、全形括號、只寫中文或只寫英文
+
+        Args:
+            entity_types (list): 實體類別，如 ["組織(ORGANIZATION)", ...]
+            empty_values (tuple): 代表沒有實體的值 (不分大小寫)
+        """
+        self.entity_types = list(entity_types)
+        self.empty_values = {v.lower() for v in empty_values}
+        self.aliases = {}
+        for ent_type in self.entity_types:
+            self.aliases[ent_type.lower()] = ent_type
+            match = re.match(r"^(.+?)[(（](.+?)[)）]$", ent_type)
+            if match:
+                zh, en = match.groups()
+                for alias in [f"{zh}（{en}）", f"{zh}({en})", zh, en]:
+                    self.aliases.setdefault(alias.lower(), ent_type)
+        alternation = "|".join(
+            re.escape(alias) for alias in sorted(self.aliases, key=len, reverse=True)
+        )
+        # 行首可有條列符號、編號或 markdown 粗體，類別後接半形或全形冒號
+        self._header = re.compile(
+            rf"^[ \t]*(?:[-*•#]+|\d+[.)、])?[ \t]*(?:\*\*)?(?P<head>{alternation})(?:\*\*)?[ \t]*[:：]",
+            re.MULTILINE | re.IGNORECASE,
+        )
+
+    def _split_values(self, text: str) -> List[str]:
+        values = []
+        for value in _VALUE_SPLITTER.split(_LINE_NUMBER.sub(r"\1", text)):
+            value = _VALUE_STRIP.sub("", value)
+            if value and value.lower() not in self.empty_values and value not in values:
+                values.append(value)
+        return values
+
+    def _parse_json(self, text: str) -> Tuple[Optional[Dict[str, list]], str]:
+        try:
+            data = json.loads(_JSON_FENCE.sub("", text))
+        except json.JSONDecodeError:
+            return None, PARSE_INVALID_JSON
+        if not isinstance(data, dict):
+            return None, PARSE_INVALID_JSON
+        entities = {}
+        for key, value in data.items():
+            ent_type = self.aliases.get(str(key).strip().lower())
+            if ent_type is None:
+                continue
+            if isinstance(value, str):
+                value = [value]
+            entities[ent_type] = self._split_values(
+                "\n".join(str(v) for v in value or [])
+            )
+        return entities, PARSE_OK
+
+    def _parse_text(self, text: str) -> Dict[str, list]:
+        entities = {}
+        headers = list(self._header.finditer(text))
+        for i, header in enumerate(headers):
+            end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+            ent_type = self.aliases[header.group("head").lower()]
+            entities.setdefault(ent_type, []).extend(
+                v
+                for v in self._split_values(text[header.end() : end])
+                if v not in entities.get(ent_type, [])
+            )
+        return entities
+
+    def parse(self, text: Optional[str]) -> Tuple[Optional[Dict[str, list]], str]:
+        """
+        Returns:
+            tuple: ({類別: [實體, ...]} 或解析失敗時的 None, 原因碼)
+        """
+        if not text or not text.strip():
+            return None, PARSE_EMPTY
+        text = text.strip()
+        if text.startswith(("{", "```")):
+            entities, reason = self._parse_json(text)
+            if entities is None:
+                # JSON 失敗時仍嘗試以文字格式解析
+                entities = self._parse_text(text) or None
+                if entities is None:
+                    return None, reason
+        else:
+            entities = self._parse_text(text)
+        if not entities:
+            return None, PARSE_NO_CATEGORY
+        reason = PARSE_OK if len(entities) == len(self.entity_types) else PARSE_PARTIAL
+        return {k: entities.get(k, []) for k in self.entity_types}, reason
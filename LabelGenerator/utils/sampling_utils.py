@@ -0,0 +1,200 @@
+import heapq
+import json
+import math
+import os
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .data_utils import atomic_path
+from .dedup_utils import shingle_hashes
+from .matcher_utils import EntityMatcher
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+class SamplingIndex:
+    def __init__(
+        self,
+        ngram_sizes: Sequence[int] = (2, 3),
+        bucket_bits: int = 20,
+        sketch_bits: int = 8,
+        unmatched_entity_score: float = 0.5,
+    ):
+        """已標記資料的字元 n-gram 文件頻率與實體出現次數，用來在本地評估新文章的價值
+
+        - novelty: 文章 n-gram 在已標記資料中的平均 IDF，套版的盤勢報導接近 0
+        - entity_score: 文章中已知實體的稀有程度，只含常見實體的文章分數低
+        - sketch: 以 IDF 加權、雜湊到 2**sketch_bits 維的向量，用於挑選時避免內容重複
+
+        n-gram 以雜湊分到 2**bucket_bits 個桶，不需保存詞表
+        """
+        self.ngram_sizes = tuple(ngram_sizes)
+        self.bucket_bits = bucket_bits
+        self.sketch_bits = sketch_bits
+        self.unmatched_entity_score = unmatched_entity_score
+        self.doc_freq = np.zeros(2**bucket_bits, dtype=np.int32)
+        self.num_docs = 0
+        self.entity_counts: Dict[str, Counter] = {}
+        self._matcher = None
+
+    def _hash_ngrams(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns: (每個 n-gram 所屬文章的 index, 混合後的 64-bit 雜湊)"""
+        hashes = [
+            np.concatenate([shingle_hashes(text, k) for k in self.ngram_sizes]) * _MIX
+            for text in texts
+        ]
+        lengths = [len(h) for h in hashes]
+        doc_index = np.repeat(np.arange(len(texts)), lengths)
+        return doc_index, np.concatenate(hashes) if hashes else np.zeros(0, np.uint64)
+
+    def _buckets(self, mixed: np.ndarray) -> np.ndarray:
+        return (mixed >> np.uint64(64 - self.bucket_bits)).astype(np.int64)
+
+    def _unique_buckets(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """每篇文章去重後的 (文章 index, 桶) 配對"""
+        doc_index, mixed = self._hash_ngrams(texts)
+        # 排序後去除相鄰重複，比 np.unique 快
+        pairs = np.sort((doc_index << self.bucket_bits) | self._buckets(mixed))
+        if len(pairs):
+            pairs = pairs[np.concatenate([[True], pairs[1:] != pairs[:-1]])]
+        return pairs >> self.bucket_bits, pairs & (2**self.bucket_bits - 1)
+
+    def novelty(self, texts: Sequence[str]) -> np.ndarray:
+        """Returns: 每篇文章 n-gram 的平均正規化 IDF，介於 0 (全部常見) 到 1 (全部未見過)"""
+        if not self.num_docs:
+            return np.ones(len(texts))
+        doc_index, buckets = self._unique_buckets(texts)
+        idf = np.log((1 + self.num_docs) / (1 + self.doc_freq[buckets])) / np.log(
+            1 + self.num_docs
+        )
+        totals = np.bincount(doc_index, weights=idf, minlength=len(texts))
+        counts = np.bincount(doc_index, minlength=len(texts))
+        return totals / np.maximum(counts, 1)
+
+    def entity_scores(self, texts: Sequence[str]) -> np.ndarray:
+        """已知實體的稀有程度 1 / (1 + log(1 + 出現次數)) 的平均，沒有已知實體時為 unmatched_entity_score"""
+        if self._matcher is None:
+            self._matcher = EntityMatcher(
+                {ent_type: list(counts) for ent_type, counts in self.entity_counts.items()}
+            )
+        scores = np.full(len(texts), self.unmatched_entity_score)
+        for i, text in enumerate(texts):
+            matched = {
+                (ent_type, text[start:end]) for start, end, ent_type in self._matcher.find(text)
+            }
+            if matched:
+                scores[i] = np.mean(
+                    [
+                        1 / (1 + math.log1p(self.entity_counts[ent_type][entity]))
+                        for ent_type, entity in matched
+                    ]
+                )
+        return scores
+
+    def score(self, texts: Sequence[str], novelty_weight: float = 0.5) -> np.ndarray:
+        """novelty 與 entity_score 的加權平均"""
+        return novelty_weight * self.novelty(texts) + (1 - novelty_weight) * self.entity_scores(
+            texts
+        )
+
+    def sketch(self, texts: Sequence[str]) -> np.ndarray:
+        """Returns: (len(texts), 2**sketch_bits) 的 L2 正規化 TF-IDF 雜湊向量 (float32)"""
+        dim = 2**self.sketch_bits
+        doc_index, mixed = self._hash_ngrams(texts)
+        idf = np.log((1 + self.num_docs) / (1 + self.doc_freq[self._buckets(mixed)])) + 1
+        # 以不同位元決定向量維度與正負號，碰撞的 n-gram 期望上互相抵銷
+        columns = (mixed >> np.uint64(64 - self.bucket_bits - self.sketch_bits)) & np.uint64(
+            dim - 1
+        )
+        signs = ((mixed >> np.uint64(8)) & np.uint64(1)).astype(np.float64) * 2 - 1
+        vectors = np.bincount(
+            doc_index * dim + columns.astype(np.int64),
+            weights=signs * idf,
+            minlength=len(texts) * dim,
+        ).reshape(len(texts), dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+    def update(
+        self, texts: Sequence[str], entities: Optional[Sequence[Dict[str, List[str]]]] = None
+    ) -> None:
+        """加入已標記的文章與其實體 ({實體類別: [實體字串, ...]})"""
+        _, buckets = self._unique_buckets(texts)
+        self.doc_freq += np.bincount(buckets, minlength=len(self.doc_freq)).astype(np.int32)
+        self.num_docs += len(texts)
+        for _entities in entities or []:
+            for ent_type, ent_list in _entities.items():
+                self.entity_counts.setdefault(ent_type, Counter()).update(set(ent_list))
+        if entities:
+            self._matcher = None
+
+    def save(self, path_prefix: str) -> None:
+        """寫成 {path_prefix}.doc_freq.npy 與 .json (參數、文章數、實體次數)"""
+        os.makedirs(os.path.dirname(os.path.abspath(path_prefix)), exist_ok=True)
+        state = {
+            "params": {
+                "ngram_sizes": list(self.ngram_sizes),
+                "bucket_bits": self.bucket_bits,
+                "sketch_bits": self.sketch_bits,
+                "unmatched_entity_score": self.unmatched_entity_score,
+            },
+            "num_docs": self.num_docs,
+            "entity_counts": {k: dict(v) for k, v in self.entity_counts.items()},
+        }
+        for suffix, save in [
+            (".doc_freq.npy", lambda f: np.save(f, self.doc_freq)),
+            (".json", lambda f: f.write(json.dumps(state, ensure_ascii=False).encode("utf-8"))),
+        ]:
+            with atomic_path(f"{path_prefix}{suffix}") as tmp_path:
+                with open(tmp_path, "wb") as f:
+                    save(f)
+
+    @classmethod
+    def load(cls, path_prefix: str, **kwargs) -> "SamplingIndex":
+        """尚未累積任何日期時以 kwargs 建立，之後沿用已存檔的參數"""
+        if not os.path.exists(f"{path_prefix}.json"):
+            return cls(**kwargs)
+        with open(f"{path_prefix}.json", encoding="utf-8") as f:
+            state = json.load(f)
+        index = cls(**state["params"])
+        index.doc_freq = np.load(f"{path_prefix}.doc_freq.npy")
+        index.num_docs = state["num_docs"]
+        index.entity_counts = {k: Counter(v) for k, v in state["entity_counts"].items()}
+        return index
+
+
+def select_diverse(
+    vectors: np.ndarray,
+    scores: np.ndarray,
+    costs: Sequence[int],
+    budget: float,
+    max_items: Optional[int] = None,
+    diversity: float = 0.5,
+) -> List[int]:
+    """在 costs 總和不超過 budget 下，依 score - diversity * 與已選文章的最大 cosine 相似度 貪婪挑選
+
+    已選文章越多分數只會下降，以 lazy greedy 只重新計算堆頂文章與新選文章的相似度
+
+    Returns:
+        list: 依挑選順序的 index
+    """
+    heap = [(-float(score), i, 0) for i, score in enumerate(scores)]
+    heapq.heapify(heap)
+    max_sim = np.zeros(len(scores))
+    selected, remaining = [], budget
+    max_items = len(scores) if max_items is None else max_items
+    while heap and len(selected) < max_items:
+        _, i, num_checked = heapq.heappop(heap)
+        if costs[i] > remaining:
+            continue
+        if num_checked < len(selected):
+            sims = vectors[selected[num_checked:]] @ vectors[i]
+            max_sim[i] = max(max_sim[i], float(sims.max()))
+            adjusted = scores[i] - diversity * max_sim[i]
+            heapq.heappush(heap, (-adjusted, i, len(selected)))
+            continue
+        selected.append(i)
+        remaining -= costs[i]
+    return selected
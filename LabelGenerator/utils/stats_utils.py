@@ -0,0 +1,132 @@
+from typing import Sequence
+
+import numpy as np
+
+from .tag_utils import TagVocab
+
+
+class LabelStats:
+    def __init__(self, vocab: TagVocab, max_span_length: int = 64, density_bins: int = 20):
+        """可累加、可合併的標記統計
+
+        - tag_counts: 各標記 id 的字元數
+        - span_counts / span_length_hist: 各實體類別的實體數與長度分布 (超過 max_span_length 計入最後一格)
+        - doc_span_hist: 每段文本的實體數分布
+        - doc_density_hist: 每段文本中屬於實體的字元比例分布，切成 density_bins 格
+        """
+        self.vocab = vocab
+        self.max_span_length = max_span_length
+        self.density_bins = density_bins
+        num_labels = len(vocab.labels)
+        self.tag_counts = np.zeros(len(vocab), dtype=np.int64)
+        self.span_length_hist = np.zeros((num_labels, max_span_length + 1), dtype=np.int64)
+        self.doc_span_hist = np.zeros(1, dtype=np.int64)
+        self.doc_density_hist = np.zeros(density_bins, dtype=np.int64)
+        self.num_docs = 0
+        self.num_chars = 0
+
+        # 以 id 查表判斷 B/S (實體開頭) 與所屬類別
+        prefixes = ["O"] + [p for _ in vocab.labels for p in vocab.prefixes]
+        self._is_start = np.asarray([p in ("B", "S") for p in prefixes])
+        self._label_index = np.asarray(
+            [-1] + [i for i in range(num_labels) for _ in vocab.prefixes], dtype=np.int64
+        )
+
+    @property
+    def span_counts(self) -> np.ndarray:
+        return self.span_length_hist.sum(axis=1)
+
+    def update(self, tag_arrays: Sequence[np.ndarray]) -> "LabelStats":
+        """一次處理一批文本的標記 id"""
+        if not len(tag_arrays):
+            return self
+        lengths = np.fromiter((len(t) for t in tag_arrays), dtype=np.int64, count=len(tag_arrays))
+        tags = np.concatenate(tag_arrays).astype(np.int64, copy=False)
+        doc_ids = np.repeat(np.arange(len(tag_arrays)), lengths)
+
+        self.tag_counts += np.bincount(tags, minlength=len(self.vocab))
+        self.num_docs += len(tag_arrays)
+        self.num_chars += len(tags)
+
+        # 每個實體由開頭 (B/S) 起算，直到下一個開頭或 O 之前
+        in_entity = tags != 0
+        is_start = self._is_start[tags]
+        span_ids = np.cumsum(is_start) - 1
+        num_spans = int(is_start.sum())
+        if num_spans:
+            span_lengths = np.bincount(span_ids[in_entity & (span_ids >= 0)], minlength=num_spans)
+            span_labels = self._label_index[tags[is_start]]
+            np.add.at(
+                self.span_length_hist,
+                (span_labels, np.minimum(span_lengths, self.max_span_length)),
+                1,
+            )
+
+        doc_spans = np.bincount(doc_ids[is_start], minlength=len(tag_arrays))
+        self._add_hist("doc_span_hist", np.bincount(doc_spans))
+        doc_entity_chars = np.bincount(doc_ids, weights=in_entity, minlength=len(tag_arrays))
+        density = np.divide(
+            doc_entity_chars, lengths, out=np.zeros(len(lengths)), where=lengths > 0
+        )
+        bins = np.minimum((density * self.density_bins).astype(np.int64), self.density_bins - 1)
+        self.doc_density_hist += np.bincount(bins, minlength=self.density_bins)
+        return self
+
+    def _add_hist(self, name: str, hist: np.ndarray) -> None:
+        current = getattr(self, name)
+        if len(hist) > len(current):
+            current = np.pad(current, (0, len(hist) - len(current)))
+        current[: len(hist)] += hist
+        setattr(self, name, current)
+
+    def merge(self, other: "LabelStats") -> "LabelStats":
+        """合併其他 shard 的統計"""
+        self.tag_counts += other.tag_counts
+        self.span_length_hist += other.span_length_hist
+        self._add_hist("doc_span_hist", other.doc_span_hist)
+        self.doc_density_hist += other.doc_density_hist
+        self.num_docs += other.num_docs
+        self.num_chars += other.num_chars
+        return self
+
+    def to_dict(self) -> dict:
+        labels = self.vocab.labels
+        return {
+            "num_docs": self.num_docs,
+            "num_chars": self.num_chars,
+            "tag_counts": {
+                self.vocab.id2tag[i]: int(c) for i, c in enumerate(self.tag_counts) if c
+            },
+            "span_counts": {label: int(c) for label, c in zip(labels, self.span_counts)},
+            "span_length_hist": {
+                label: {int(n): int(c) for n, c in enumerate(hist) if c}
+                for label, hist in zip(labels, self.span_length_hist)
+            },
+            "doc_span_hist": {int(n): int(c) for n, c in enumerate(self.doc_span_hist) if c},
+            "doc_density_hist": self.doc_density_hist.tolist(),
+            "mean_spans_per_doc": (
+                float(self.span_counts.sum() / self.num_docs) if self.num_docs else 0.0
+            ),
+        }
+
+    @classmethod
+    def from_dict(
+        cls, data: dict, vocab: TagVocab, max_span_length: int = 64
+    ) -> "LabelStats":
+        """由 to_dict 的輸出 (例如存檔的 json) 還原，以便跨 shard 累加"""
+        stats = cls(vocab, max_span_length=max_span_length, density_bins=len(data["doc_density_hist"]))
+        stats.num_docs = data["num_docs"]
+        stats.num_chars = data["num_chars"]
+        for tag, c in data["tag_counts"].items():
+            stats.tag_counts[vocab.tag2id[tag]] = c
+        for i, label in enumerate(vocab.labels):
+            for n, c in data["span_length_hist"].get(label, {}).items():
+                stats.span_length_hist[i, min(int(n), max_span_length)] += c
+        doc_span_hist = data["doc_span_hist"]
+        stats.doc_span_hist = np.zeros(
+            max((int(n) for n in doc_span_hist), default=0) + 1, dtype=np.int64
+        )
+        for n, c in doc_span_hist.items():
+            stats.doc_span_hist[int(n)] = c
+        stats.doc_density_hist = np.asarray(data["doc_density_hist"], dtype=np.int64)
+        return stats
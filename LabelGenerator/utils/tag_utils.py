@@ -0,0 +1,88 @@
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+TAG_DTYPE = np.uint8
+OFFSET_DTYPE = np.int64
+
+
+class TagVocab:
+    def __init__(self, labels: Iterable[str], scheme: str = "BIOES"):
+        """標記與 id 對照表，id 0 固定為 "O"，每個 label 依 scheme 順序佔用連續 id
+
+        例如 labels=["ORG", "COM"]: O=0, B-ORG=1, I-ORG=2, E-ORG=3, S-ORG=4, B-COM=5, ...
+        """
+        self.labels = list(labels)
+        self.prefixes = [p for p in scheme if p != "O"]
+        self.id2tag = ["O"] + [f"{p}-{label}" for label in self.labels for p in self.prefixes]
+        if len(self.id2tag) > np.iinfo(TAG_DTYPE).max + 1:
+            raise ValueError(f"too many tags for {np.dtype(TAG_DTYPE).name}: {len(self.id2tag)}")
+        self.tag2id = {tag: i for i, tag in enumerate(self.id2tag)}
+        self._id2tag = np.asarray(self.id2tag, dtype=object)
+
+    def __len__(self):
+        return len(self.id2tag)
+
+    def tag_id(self, prefix: str, label: str) -> int:
+        return self.tag2id[f"{prefix}-{label}"]
+
+    def label_ids(self, labels: Sequence[str], prefix: str) -> np.ndarray:
+        return np.asarray([self.tag_id(prefix, label) for label in labels], dtype=TAG_DTYPE)
+
+    def encode(self, tags: Sequence[str]) -> np.ndarray:
+        return np.fromiter((self.tag2id[t] for t in tags), dtype=TAG_DTYPE, count=len(tags))
+
+    def decode(self, tag_ids: np.ndarray) -> List[str]:
+        return self._id2tag[np.asarray(tag_ids)].tolist()
+
+
+def spans_to_tag_ids(
+    length: int,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    begin_ids: np.ndarray,
+    inside_ids: np.ndarray,
+) -> np.ndarray:
+    """不重疊的 [start, end) 區間轉成 B/I 標記 id，未涵蓋位置為 0 ("O")
+
+    以差分陣列 + cumsum 填入 I，再覆寫每段開頭為 B，不需逐字迴圈
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    inside_ids = np.asarray(inside_ids, dtype=np.int64)
+    delta = np.zeros(length + 1, dtype=np.int64)
+    np.add.at(delta, starts + 1, inside_ids)
+    np.add.at(delta, ends, -inside_ids)
+    tag_ids = np.cumsum(delta[:length]).astype(TAG_DTYPE)
+    tag_ids[starts] = begin_ids
+    return tag_ids
+
+
+def save_tag_shard(path_prefix: str, tag_arrays: Sequence[np.ndarray]) -> None:
+    """多筆標記 id 串接成 {path_prefix}.tags.npy，並以 {path_prefix}.offsets.npy 記錄每筆起訖"""
+    offsets = np.zeros(len(tag_arrays) + 1, dtype=OFFSET_DTYPE)
+    np.cumsum([len(t) for t in tag_arrays], out=offsets[1:])
+    tags = (
+        np.concatenate(tag_arrays).astype(TAG_DTYPE, copy=False)
+        if len(tag_arrays)
+        else np.zeros(0, dtype=TAG_DTYPE)
+    )
+    np.save(f"{path_prefix}.tags.npy", tags)
+    np.save(f"{path_prefix}.offsets.npy", offsets)
+
+
+class TagShard:
+    def __init__(self, path_prefix: str, mmap: bool = True):
+        """讀取 save_tag_shard 的輸出，預設 memory-map 不載入記憶體"""
+        mmap_mode = "r" if mmap else None
+        self.tags = np.load(f"{path_prefix}.tags.npy", mmap_mode=mmap_mode)
+        self.offsets = np.load(f"{path_prefix}.offsets.npy", mmap_mode=mmap_mode)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self.tags[self.offsets[i] : self.offsets[i + 1]]
+
+    def span(self, i: int) -> Tuple[int, int]:
+        return int(self.offsets[i]), int(self.offsets[i + 1])
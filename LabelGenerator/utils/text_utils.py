@@ -0,0 +1,63 @@
+import re
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+
+OFFSET_DTYPE = np.int32
+
+
+def normalize_with_offsets(
+    text: str, substitutions: Sequence[Tuple[Union[str, re.Pattern], str]]
+) -> Tuple[str, np.ndarray]:
+    """依序套用 (pattern, 取代字串) 清理文本，並保留每個字元對應回原文的位置
+
+    取代字串中的每個字元都對應到被取代片段在原文的開頭
+
+    Returns:
+        tuple: (清理後文本, offsets)，offsets[i] 為清理後第 i 個字元在原文的位置
+    """
+    offsets = np.arange(len(text), dtype=OFFSET_DTYPE)
+    for pattern, repl in substitutions:
+        pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        pieces, maps, pos = [], [], 0
+        for match in pattern.finditer(text):
+            start, end = match.span()
+            pieces.append(text[pos:start])
+            maps.append(offsets[pos:start])
+            pieces.append(repl)
+            maps.append(np.full(len(repl), offsets[start], dtype=OFFSET_DTYPE))
+            pos = end
+        if not pieces:
+            continue
+        pieces.append(text[pos:])
+        maps.append(offsets[pos:])
+        text, offsets = "".join(pieces), np.concatenate(maps)
+    return text, offsets
+
+
+def source_span(offsets: np.ndarray, start: int, end: int) -> Tuple[int, int]:
+    """清理後文本的 [start, end) (非空) 對應回原文的範圍"""
+    return int(offsets[start]), int(offsets[end - 1]) + 1
+
+
+def project_spans(
+    starts: np.ndarray, ends: np.ndarray, chunk_start: int, chunk_end: int
+) -> Tuple[int, int]:
+    """在依 start 排序且不重疊的區間中，找出完全落在 [chunk_start, chunk_end) 內者
+
+    Returns:
+        tuple: (lo, hi)，starts[lo:hi] 即為落在該段內的區間
+    """
+    lo = int(np.searchsorted(starts, chunk_start, side="left"))
+    hi = int(np.searchsorted(ends, chunk_end, side="right"))
+    return lo, max(lo, hi)
+
+
+def group_spans(
+    spans: List[Tuple[int, int, str]], shift: int = 0
+) -> dict:
+    """[(start, end, 類別), ...] 轉成 {類別: [(start - shift, end - shift), ...]}"""
+    grouped = {}
+    for start, end, label in spans:
+        grouped.setdefault(label, []).append((start - shift, end - shift))
+    return grouped
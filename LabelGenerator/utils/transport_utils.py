@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+from .metrics_utils import Metrics
+
+# aiohttp 與 openai 於第一次送出請求時才 import
+if TYPE_CHECKING:
+    import aiohttp
+
+# 錯誤分類
+ERROR_RATE_LIMIT = "rate_limit"  # 429
+ERROR_SERVER = "server"  # 5xx
+ERROR_TIMEOUT = "timeout"  # 逾時或連線失敗
+ERROR_CLIENT = "client"  # 其他 4xx，重送也不會成功
+RETRYABLE_ERRORS = (ERROR_RATE_LIMIT, ERROR_SERVER, ERROR_TIMEOUT)
+
+
+def classify_error(err: Exception) -> str:
+    """依例外型別與 HTTP status 分類，只有 ERROR_CLIENT 不重試"""
+    import openai
+
+    if isinstance(
+        err, (openai.error.Timeout, openai.error.APIConnectionError, asyncio.TimeoutError)
+    ):
+        return ERROR_TIMEOUT
+    status = getattr(err, "http_status", None)
+    if isinstance(err, openai.error.RateLimitError) or status == 429:
+        # 額度用完的 429 要等人處理，重送沒有意義
+        if getattr(err, "code", None) == "insufficient_quota":
+            return ERROR_CLIENT
+        return ERROR_RATE_LIMIT
+    if isinstance(err, (openai.error.ServiceUnavailableError, openai.error.TryAgain)):
+        return ERROR_SERVER
+    if status is not None:
+        return ERROR_SERVER if status >= 500 else ERROR_CLIENT
+    # 沒有 status 的 APIError 多為回應格式錯誤，視為伺服器端問題
+    if type(err) is openai.error.APIError:
+        return ERROR_SERVER
+    return ERROR_CLIENT
+
+
+def retry_after(err: Exception) -> Optional[float]:
+    """由回應 header 的 Retry-After (秒數或 HTTP 日期) 或 retry-after-ms 取得等待秒數"""
+    headers = getattr(err, "headers", None) or {}
+    value = headers.get("retry-after-ms") or headers.get("Retry-After-Ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    def __init__(
+        self, max_retries: int = 8, base_delay: float = 1, max_delay: float = 60
+    ):
+        """指數退避加上 full jitter，伺服器指定 Retry-After 時至少等待該秒數"""
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, err: Optional[Exception] = None) -> float:
+        """第 attempt 次 (從 0 起算) 失敗後的等待秒數"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        server_delay = retry_after(err) if err is not None else None
+        if server_delay is not None:
+            delay = max(delay, min(server_delay, self.max_delay))
+        return delay
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, recovery_time: float = 30):
+        """連續 failure_threshold 次可重試的錯誤後斷路，recovery_time 秒內不送出請求
+
+        斷路時間過後只放行一個試探請求 (half-open)，成功才恢復，失敗則再次斷路
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def wait_time(self) -> float:
+        """回傳送出前需等待的秒數，0 代表可以送出"""
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            remaining = self._opened_at + self.recovery_time - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self._probing:
+                # 等待試探請求的結果
+                return min(1.0, self.recovery_time)
+            self.state = "half_open"
+            self._probing = True
+            return 0.0
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """結果不代表恢復或失敗 (例如 4xx) 時呼叫，狀態不變，只讓出試探名額給下一個請求"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logging.warning(
+                        f"Circuit opened after {self._failures} failures, "
+                        f"pausing {self.recovery_time}s"
+                    )
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class Transport:
+    def __init__(
+        self,
+        timeout: float = 60,
+        pool_size: int = 100,
+        keepalive_timeout: float = 30,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        metrics: Optional[Metrics] = None,
+    ):
+        """OpenAI 請求的重試、斷路與量測，async 請求共用 keep-alive 連線池
+
+        同步請求沿用 openai 套件每個執行緒各自的 requests.Session (本身即 keep-alive)
+        metrics 依 model 記錄 api_latency、api_requests、api_retries 與 api_errors (依錯誤分類)
+        """
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.metrics = metrics or Metrics()
+        self._session = None
+        self._loop = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        import aiohttp
+
+        # ClientSession 綁定 event loop，每次 asyncio.run 都是新的 loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size, keepalive_timeout=self.keepalive_timeout
+            )
+            self._session, self._loop = aiohttp.ClientSession(connector=connector), loop
+        return self._session
+
+    async def aclose(self) -> None:
+        """關閉連線池，應在同一個 event loop 結束前呼叫"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session, self._loop = None, None
+
+    def _record(self, model: str, start: float, error: Optional[str] = None) -> None:
+        self.metrics.observe("api_latency", time.perf_counter() - start, model=model)
+        self.metrics.incr("api_requests", model=model)
+        if error is not None:
+            self.metrics.incr("api_errors", model=model, kind=error)
+
+    def _on_error(self, model: str, start: float, attempt: int, err: Exception) -> float:
+        """記錄錯誤並回傳重試前的等待秒數，不可重試時直接拋出"""
+        kind = classify_error(err)
+        self._record(model, start, error=kind)
+        if kind not in RETRYABLE_ERRORS:
+            # 請求本身有誤，無法判斷伺服器是否恢復，不計入成功或失敗
+            self.circuit_breaker.release_probe()
+            raise err
+        self.circuit_breaker.record_failure()
+        if attempt >= self.retry_policy.max_retries:
+            raise err
+        delay = self.retry_policy.delay(attempt, err)
+        self.metrics.incr("api_retries", model=model)
+        logging.warning(f"{model} {kind} error ({err}), retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    def call(self, fn: Callable, **kwargs):
+        """同步呼叫 fn(request_timeout=..., **kwargs)，可重試的錯誤依 retry_policy 重送
+
+        量測數據以 kwargs 中的 model 分組
+        """
+        model = kwargs.get("model", "")
+        attempt = 0
+        while True:
+            wait = self.circuit_breaker.wait_time()
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            start = time.perf_counter()
+            try:
+                response = fn(request_timeout=self.timeout, **kwargs)
+            except Exception as err:
+                time.sleep(self._on_error(model, start, attempt, err))
+                attempt += 1
+                continue
+            self._record(model, start)
+            self.circuit_breaker.record_success()
+            return response
+
+    async def acall(
+        self,
+        fn: Callable[..., Awaitable],
+        before_attempt: Optional[Callable[[], Awaitable]] = None,
+        **kwargs,
+    ):
+        """call 的 asyncio 版本，before_attempt 會在每次送出前 await (例如 rate limiter)"""
+        import openai
+
+        model = kwargs.get("model", "")
+        openai.aiosession.set(self._get_session())
+        attempt = 0
+        while True:
+            wait = self.circuit_breaker.wait_time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            if before_attempt is not None:
+                await before_attempt()
+            start = time.perf_counter()
+            try:
+                response = await fn(request_timeout=self.timeout, **kwargs)
+            except Exception as err:
+                await asyncio.sleep(self._on_error(model, start, attempt, err))
+                attempt += 1
+                continue
+            self._record(model, start)
+            self.circuit_breaker.record_success()
+            return response
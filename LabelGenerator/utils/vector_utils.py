@@ -0,0 +1,73 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .openai_utils import EMBEDDING_DTYPE, OpenAIAPIWrapper
+
+
+class EmbeddingWriter:
+    def __init__(self, path_prefix: str, ids: Sequence[str], dim: int = 1536):
+        """預先配置 {path_prefix}.vectors.npy (len(ids) x dim 的 float32 memmap)，
+        並以 {path_prefix}.ids.npy 記錄每列對應的 id"""
+        self.path_prefix = path_prefix
+        self.dim = dim
+        np.save(f"{path_prefix}.ids.npy", np.asarray([str(i) for i in ids]))
+        self.vectors = np.lib.format.open_memmap(
+            f"{path_prefix}.vectors.npy",
+            mode="w+",
+            dtype=EMBEDDING_DTYPE,
+            shape=(len(ids), dim),
+        )
+
+    def write(self, indices: Sequence[int], vectors: np.ndarray) -> None:
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected dim {self.dim}, got {vectors.shape[1]}")
+        self.vectors[indices] = vectors
+
+    def close(self) -> None:
+        self.vectors.flush()
+        del self.vectors
+
+
+class EmbeddingStore:
+    def __init__(self, path_prefix: str, mmap: bool = True):
+        """讀取 EmbeddingWriter 的輸出，預設 memory-map 不載入記憶體"""
+        mmap_mode = "r" if mmap else None
+        self.vectors = np.load(f"{path_prefix}.vectors.npy", mmap_mode=mmap_mode)
+        self.ids = np.load(f"{path_prefix}.ids.npy")
+        self._index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self.vectors[i]
+
+    def index_of(self, id: str) -> Optional[int]:
+        if self._index is None:
+            self._index = {str(_id): i for i, _id in enumerate(self.ids)}
+        return self._index.get(str(id))
+
+    def get(self, id: str) -> Optional[np.ndarray]:
+        i = self.index_of(id)
+        return None if i is None else self.vectors[i]
+
+
+def embed_to_store(
+    api: OpenAIAPIWrapper,
+    ids: Sequence[str],
+    texts: Sequence[str],
+    path_prefix: str,
+    model: str = "text-embedding-ada-002",
+    dim: int = 1536,
+    **kwargs,
+) -> EmbeddingStore:
+    """批次取得 texts 的 embedding，邊收邊寫入 memmap，回傳可讀取的 EmbeddingStore
+
+    kwargs 會傳給 OpenAIAPIWrapper.iter_embeddings_batch (max_batch_tokens 等)
+    """
+    writer = EmbeddingWriter(path_prefix, ids, dim=dim)
+    for indices, vectors in api.iter_embeddings_batch(texts, model=model, **kwargs):
+        writer.write(indices, vectors)
+    writer.close()
+    return EmbeddingStore(path_prefix)
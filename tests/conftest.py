@@ -0,0 +1,73 @@
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+# 從 repo 根目錄以 pytest 執行，讓 LabelGenerator 套件可被 import
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from LabelGenerator.benchmarks.synthetic import FakeChatServer
+from LabelGenerator.utils import openai_utils
+from LabelGenerator.utils.async_utils import AsyncLabelingEngine
+from LabelGenerator.utils.openai_utils import OpenAIAPIWrapper
+
+
+class CharEncoding:
+    """每個字元一個 token 的編碼，取代需要下載 BPE 檔的 tiktoken 編碼"""
+
+    name = "char"
+
+    def encode(self, text: str) -> list:
+        return [ord(c) for c in text]
+
+    def encode_batch(self, texts: list, num_threads: int = 8) -> list:
+        return [self.encode(text) for text in texts]
+
+    def decode(self, tokens: list) -> str:
+        return "".join(chr(t) for t in tokens)
+
+
+@pytest.fixture(autouse=True, scope="session")
+def offline_encoding():
+    """token 數只影響預估與打包，測試不需要真正的 cl100k_base，也不連網下載"""
+    import tiktoken
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(tiktoken, "encoding_for_model", lambda model: CharEncoding())
+        mp.setattr(tiktoken, "get_encoding", lambda name: CharEncoding())
+        openai_utils._resolve_encoding.cache_clear()
+        openai_utils._resolve_token_counting.cache_clear()
+        yield
+    openai_utils._resolve_encoding.cache_clear()
+    openai_utils._resolve_token_counting.cache_clear()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def fake_server():
+    """fake_server(**kwargs) 啟動不延遲的假 server，測試結束時關閉"""
+    servers = []
+
+    def start(**kwargs) -> FakeChatServer:
+        kwargs.setdefault("latency", 0)
+        server = FakeChatServer(port=_free_port(), **kwargs).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def make_engine(server: FakeChatServer, max_retries: int = 2, **kwargs) -> AsyncLabelingEngine:
+    """連到假 server 的 engine，重試不退避、RPM/TPM 不設限"""
+    api = OpenAIAPIWrapper(API_KEY="fake", api_base=server.api_base, max_retries=max_retries)
+    api.transport.retry_policy.base_delay = 0
+    kwargs.setdefault("requests_per_minute", 10**9)
+    kwargs.setdefault("tokens_per_minute", 10**12)
+    return AsyncLabelingEngine(api=api, generation_params={"temperature": 0}, **kwargs)
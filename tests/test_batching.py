@@ -0,0 +1,85 @@
+import asyncio
+
+from conftest import make_engine
+
+from LabelGenerator.benchmarks.synthetic import generate_articles
+from LabelGenerator.tasks.ner import NER
+from LabelGenerator.utils.async_utils import LABEL_FAILED, LABEL_OK
+from LabelGenerator.utils.batching_utils import (
+    build_batch_content,
+    demux_batch_response,
+    pack_batches,
+)
+
+
+def test_pack_batches():
+    assert pack_batches([3, 3, 3, 3], max_tokens=6) == [[0, 1], [2, 3]]
+    assert pack_batches([3, 3, 3], max_tokens=100, max_batch_size=2) == [[0, 1], [2]]
+    # 超過上限的單一項目自成一包
+    assert pack_batches([2, 10, 2], max_tokens=5) == [[0], [1], [2]]
+    assert pack_batches([], max_tokens=5) == []
+
+
+def test_demux_batch_response():
+    response = "好的，結果如下\n[#1] 公司: 台積電\n\n[#2] 公司: 無\n[#3]\t人物: 魏哲家"
+    assert demux_batch_response(response, 3) == ["公司: 台積電", "公司: 無", "人物: 魏哲家"]
+
+
+def test_demux_batch_response_roundtrip():
+    items = ["甲", "乙\n第二行", "丙"]
+    assert demux_batch_response(build_batch_content(items), 3) == items
+
+
+def test_demux_batch_response_missing_duplicate_and_extra():
+    # 缺少的編號、重複的編號與空白回覆皆為 None，超出範圍的編號略過
+    assert demux_batch_response("[#1] a\n[#3] c", 3) == ["a", None, "c"]
+    assert demux_batch_response("[#1] a\n[#1] b\n[#2] c", 2) == [None, "c"]
+    assert demux_batch_response("[#1] a\n[#2]\n[#9] z", 2) == ["a", None]
+    assert demux_batch_response("沒有編號的回覆", 2) == [None, None]
+
+
+def _label_packed(engine, articles, **kwargs):
+    return asyncio.run(
+        engine._run_and_close(
+            engine.alabel_packed(
+                articles, build_messages=NER.build_messages, return_status=True, **kwargs
+            )
+        )
+    )
+
+
+def _articles(num_articles):
+    return [a["content"][:300] for a in generate_articles(num_articles)]
+
+
+def test_packed_results_match_single_requests(fake_server):
+    articles = _articles(6)
+    server = fake_server()
+    engine = make_engine(server)
+    packed = _label_packed(engine, articles, max_batch_tokens=10**6)
+    assert server.num_requests == 1
+
+    single = make_engine(server).label([NER.build_messages([a]) for a in articles])
+    assert [status for _, status in packed] == [LABEL_OK] * len(articles)
+    assert [result for result, _ in packed] == single
+
+
+def test_undemuxable_batch_is_split_and_retried(fake_server):
+    # 每個多篇請求都漏掉最後一篇：4 篇 -> 2 + 2 -> 1 + 1 + 1 + 1，共 7 個請求
+    articles = _articles(4)
+    server = fake_server(batch_drop_rate=1.0)
+    results = _label_packed(make_engine(server), articles, max_batch_tokens=10**6)
+
+    assert server.num_requests == 7
+    assert [status for _, status in results] == [LABEL_OK] * len(articles)
+    single = make_engine(fake_server()).label([NER.build_messages([a]) for a in articles])
+    assert [result for result, _ in results] == single
+
+
+def test_failed_batch_marks_every_item(fake_server):
+    articles = _articles(5)
+    server = fake_server(bad_request_rate=1.0)
+    results = _label_packed(make_engine(server), articles, max_batch_tokens=10**6)
+
+    assert server.num_requests == 1
+    assert results == [(None, LABEL_FAILED)] * len(articles)
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from LabelGenerator.benchmarks.synthetic import format_ner_output, generate_articles
+from LabelGenerator.CustomNER import formatting
+from LabelGenerator.utils.checkpoint_utils import ShardedCheckpoint
+from LabelGenerator.utils.export_utils import SPLITS
+
+
+def _split_ids(export_dir: Path) -> dict:
+    """{input_id: 所屬切分}"""
+    return {
+        input_id: name
+        for name in SPLITS
+        for input_id in (export_dir / name / "data.ids.txt").read_text().split()
+    }
+
+
+def test_near_duplicates_share_the_canonical_split(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    articles = generate_articles(60)
+    ShardedCheckpoint("prompt_results", prefix="prompt_result-20230101").write_shard(
+        {
+            "input_id": [a["id"] for a in articles],
+            "input": [a["content"] for a in articles],
+            "openai_output": [format_ner_output(a["entities"]) for a in articles],
+        }
+    )
+    ShardedCheckpoint("dedup_results", prefix="dedup-20230102").write_shard(
+        {
+            "input_id": [f"{a['id']}-dup" for a in articles],
+            "input": [a["content"] + "。" for a in articles],
+            "canonical_id": [a["id"] for a in articles],
+        }
+    )
+    formatting.run_formatting(num_workers=1, chunk_size=20)
+    formatting.export_splits(keep_empty=True)
+
+    splits = _split_ids(tmp_path / "training_data")
+    assert len(set(splits.values())) > 1
+    for a in articles:
+        assert splits[f"{a['id']}-dup"] == splits[a["id"]]
@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+
+import pandas as pd
+from conftest import make_engine
+
+from LabelGenerator import runner
+from LabelGenerator.benchmarks.synthetic import generate_articles
+from LabelGenerator.tasks.base import LabelTask
+from LabelGenerator.utils.budget_utils import TokenBudget
+from LabelGenerator.utils.checkpoint_utils import ShardedCheckpoint
+from LabelGenerator.utils.dedup_utils import NearDuplicateIndex
+from LabelGenerator.utils.sampling_utils import SamplingIndex
+
+
+def _news(engine, num_articles):
+    articles = generate_articles(num_articles)
+    news = pd.DataFrame(
+        {
+            "id": [a["id"] for a in articles],
+            "content": [a["content"] for a in articles],
+            "article": [a["content"][:300] for a in articles],
+        }
+    )
+    news["num_tokens"] = engine.api.num_tokens_batch(news["article"].tolist())
+    return news
+
+
+def _label_task(engine, task, news):
+    args = argparse.Namespace(plan_only=False, batch_mode=False)
+    return asyncio.run(
+        engine._run_and_close(runner.label_task("20230101", task, news, engine, args))
+    )
+
+
+def _written_ids(task):
+    checkpoint = ShardedCheckpoint(task.output_dir, prefix=f"{task.output_prefix}-20230101")
+    return checkpoint.done_ids()
+
+
+def test_failed_requests_do_not_stop_the_date(fake_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "SHARD_SIZE", 5)
+    server = fake_server(bad_request_rate=0.3)
+    engine = make_engine(server)
+    task = LabelTask("test", prompt="{article}", output_dir=str(tmp_path))
+    news = _news(engine, 20)
+    stats = _label_task(engine, task, news)
+
+    # 400 不重試，失敗的文章記錄下來，其餘 shard 照常標記
+    assert server.num_requests == len(news)
+    assert 0 < stats["failed"] < len(news)
+    assert not stats["budget_reached"]
+    assert stats["num_labeled"] + stats["failed"] == len(news)
+    assert len(stats["failed_ids"]) == stats["failed"]
+    written = _written_ids(task)
+    assert written.isdisjoint(stats["failed_ids"])
+    assert written | set(stats["failed_ids"]) == set(news["id"].astype(str))
+    counters = engine.api.metrics.counters
+    assert counters[("articles_failed", (("task", "test"),))] == stats["failed"]
+
+
+def test_budget_stops_the_date(fake_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "SHARD_SIZE", 5)
+    server = fake_server()
+    engine = make_engine(server, concurrency=1)
+    news = _news(engine, 20)
+    # 預算大約只夠前幾篇
+    num_tokens = int(news["num_tokens"][:3].sum()) + 3 * (engine.expected_output_tokens + 50)
+    engine.budget = TokenBudget(engine.api, max_cost=engine.api.price_counter(num_tokens))
+    task = LabelTask("test", prompt="{article}", output_dir=str(tmp_path))
+    stats = _label_task(engine, task, news)
+
+    assert stats["budget_reached"]
+    assert stats["failed"] == 0
+    assert 0 < stats["num_labeled"] < 5
+    assert server.num_requests == stats["num_labeled"]
+
+
+def test_plan_only_leaves_dedup_and_sampling_state_untouched(
+    fake_server, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    server = fake_server()
+    engine = make_engine(server)
+    articles = generate_articles(10)
+    # 另加前 3 篇的近似重複，plan 仍會扣除重複文章
+    duplicates = [{"id": f"{a['id']}-dup", "content": a["content"] + "。"} for a in articles[:3]]
+    news = pd.DataFrame(articles + duplicates)[["id", "content"]]
+    args = argparse.Namespace(
+        plan_only=True,
+        batch_mode=False,
+        sample_tokens=10**6,
+        sample_top_k=None,
+        near_dup_index_path=str(tmp_path / "cache" / "ndi"),
+        sampling_index_path=str(tmp_path / "cache" / "si"),
+    )
+    near_dup_index = NearDuplicateIndex()
+    stats = asyncio.run(
+        engine._run_and_close(
+            runner.label_date(
+                "20230101",
+                news,
+                {"ner": engine},
+                args,
+                near_dup_index,
+                asyncio.Lock(),
+                SamplingIndex(),
+                asyncio.Lock(),
+            )
+        )
+    )
+
+    assert server.num_requests == 0
+    assert stats["tasks"]["ner"]["plan"]["num_requests"] == len(articles)
+    assert len(near_dup_index) == 0
+    # 不寫出索引、dedup_results 與 sampling_results (checkpoint 只建立空目錄)
+    assert [p for p in tmp_path.rglob("*") if p.is_file()] == []
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import openai
+import pytest
+from conftest import make_engine
+
+from LabelGenerator.utils.async_utils import LABEL_FAILED, LABEL_OK
+from LabelGenerator.utils.transport_utils import (
+    ERROR_CLIENT,
+    ERROR_RATE_LIMIT,
+    ERROR_SERVER,
+    ERROR_TIMEOUT,
+    CircuitBreaker,
+    RetryPolicy,
+    Transport,
+    classify_error,
+    retry_after,
+)
+
+
+@pytest.mark.parametrize(
+    "err, kind",
+    [
+        (openai.error.Timeout("timed out"), ERROR_TIMEOUT),
+        (openai.error.APIConnectionError("connection reset"), ERROR_TIMEOUT),
+        (asyncio.TimeoutError(), ERROR_TIMEOUT),
+        (openai.error.RateLimitError("slow down", http_status=429), ERROR_RATE_LIMIT),
+        (openai.error.APIError("too many", http_status=429), ERROR_RATE_LIMIT),
+        (
+            openai.error.RateLimitError("quota", http_status=429, code="insufficient_quota"),
+            ERROR_CLIENT,
+        ),
+        (openai.error.ServiceUnavailableError("overloaded", http_status=503), ERROR_SERVER),
+        (openai.error.TryAgain("busy"), ERROR_SERVER),
+        (openai.error.APIError("bad gateway", http_status=502), ERROR_SERVER),
+        (openai.error.APIError("invalid response"), ERROR_SERVER),
+        (openai.error.InvalidRequestError("too long", None, http_status=400), ERROR_CLIENT),
+        (openai.error.AuthenticationError("bad key", http_status=401), ERROR_CLIENT),
+        (ValueError("unexpected"), ERROR_CLIENT),
+    ],
+)
+def test_classify_error(err, kind):
+    assert classify_error(err) == kind
+
+
+def _rate_limit_error(**headers) -> openai.error.RateLimitError:
+    return openai.error.RateLimitError("slow down", http_status=429, headers=headers)
+
+
+def _bad_request(**kwargs):
+    raise openai.error.InvalidRequestError("too long", None, http_status=400)
+
+
+def test_retry_after_headers():
+    assert retry_after(_rate_limit_error(**{"retry-after-ms": "250"})) == 0.25
+    assert retry_after(_rate_limit_error(**{"Retry-After": "3"})) == 3
+    # 同時存在時以毫秒為準
+    assert retry_after(_rate_limit_error(**{"retry-after": "3", "retry-after-ms": "500"})) == 0.5
+    assert retry_after(_rate_limit_error(**{"retry-after-ms": "soon", "retry-after": "2"})) == 2
+    assert retry_after(_rate_limit_error()) is None
+    assert retry_after(_rate_limit_error(**{"retry-after": "soon"})) is None
+    assert retry_after(ValueError()) is None
+
+
+def test_retry_after_http_date():
+    later = formatdate(time.time() + 30, usegmt=True)
+    assert retry_after(_rate_limit_error(**{"retry-after": later})) == pytest.approx(30, abs=2)
+    earlier = formatdate(time.time() - 30, usegmt=True)
+    assert retry_after(_rate_limit_error(**{"retry-after": earlier})) == 0
+
+
+def test_retry_policy_waits_at_least_retry_after():
+    policy = RetryPolicy(base_delay=0, max_delay=5)
+    assert policy.delay(0, _rate_limit_error(**{"retry-after-ms": "1500"})) == 1.5
+    # 伺服器要求的等待也受 max_delay 限制
+    assert policy.delay(0, _rate_limit_error(**{"retry-after": "600"})) == 5
+    assert policy.delay(0, openai.error.APIError("bad gateway", http_status=502)) == 0
+
+
+def test_circuit_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, recovery_time=10)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.wait_time() == 0
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert 9 < breaker.wait_time() <= 10
+    # 成功會重設連續失敗次數
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_half_open_probe():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=0.05)
+    breaker.record_failure()
+    assert breaker.wait_time() > 0
+    time.sleep(0.06)
+
+    # 斷路時間過後只放行一個試探請求
+    assert breaker.wait_time() == 0
+    assert breaker.state == "half_open"
+    assert breaker.wait_time() > 0
+    # 試探失敗再次斷路
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.wait_time() > 0
+    time.sleep(0.06)
+
+    assert breaker.wait_time() == 0
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.wait_time() == 0
+
+
+def test_client_error_keeps_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_time=10)
+    transport = Transport(circuit_breaker=breaker)
+    breaker.record_failure()
+    with pytest.raises(openai.error.InvalidRequestError):
+        transport.call(_bad_request)
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_client_error_on_probe_leaves_breaker_half_open():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=0.05)
+    transport = Transport(circuit_breaker=breaker)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    # 試探請求遇到 4xx 不代表恢復，維持 half-open 並讓下一個請求試探
+    with pytest.raises(openai.error.InvalidRequestError):
+        transport.call(_bad_request)
+    assert breaker.state == "half_open"
+    assert breaker.wait_time() == 0
+    assert breaker.wait_time() > 0
+
+
+def test_rate_limited_requests_are_retried(fake_server):
+    server = fake_server(rate_limit_rate=0.3)
+    engine = make_engine(server, max_retries=8)
+    messages_list = [[{"role": "user", "content": f"文本 {i}"}] for i in range(20)]
+    results = engine.label(messages_list)
+
+    assert all(result is not None for result in results)
+    counters = engine.api.metrics.counters
+    model = ("model", "gpt-3.5-turbo")
+    num_rate_limited = counters[("api_errors", (("kind", ERROR_RATE_LIMIT), model))]
+    assert num_rate_limited > 0
+    assert server.num_requests == len(messages_list) + num_rate_limited
+    assert counters[("api_retries", (model,))] == num_rate_limited
+
+
+def test_retries_wait_for_retry_after(fake_server):
+    # 假 server 的 429 附 Retry-After: 0.1，退避為 0 時每次重試仍至少等待 0.1 秒
+    server = fake_server(rate_limit_rate=1.0)
+    engine = make_engine(server, max_retries=2)
+    start = time.perf_counter()
+    [(result, status)] = asyncio.run(
+        engine._run_and_close(
+            engine.alabel([[{"role": "user", "content": "文本"}]], return_status=True)
+        )
+    )
+    assert time.perf_counter() - start >= 0.2
+    assert (result, status) == (None, LABEL_FAILED)
+    assert server.num_requests == 3
+
+
+def test_circuit_breaker_pauses_requests(fake_server):
+    server = fake_server(error_rate=1.0)
+    engine = make_engine(server, max_retries=3)
+    engine.api.transport.circuit_breaker = CircuitBreaker(failure_threshold=2, recovery_time=0.2)
+    start = time.perf_counter()
+    [(result, status)] = asyncio.run(
+        engine._run_and_close(
+            engine.alabel([[{"role": "user", "content": "文本"}]], return_status=True)
+        )
+    )
+    # 第 2 次失敗後斷路，之後兩次 half-open 試探各等待 recovery_time
+    assert time.perf_counter() - start >= 0.4
+    assert status == LABEL_FAILED
+    assert server.num_requests == 4
+    assert engine.api.transport.circuit_breaker.state == "open"
+
+
+def test_bad_request_is_not_retried(fake_server):
+    server = fake_server(bad_request_rate=1.0)
+    engine = make_engine(server, max_retries=8)
+    messages_list = [[{"role": "user", "content": f"文本 {i}"}] for i in range(5)]
+    results = asyncio.run(
+        engine._run_and_close(engine.alabel(messages_list, return_status=True))
+    )
+
+    assert results == [(None, LABEL_FAILED)] * len(messages_list)
+    assert server.num_requests == len(messages_list)
+    # 400 代表伺服器正常，不計入斷路
+    assert engine.api.transport.circuit_breaker.state == "closed"
+    assert engine.api.metrics.counters[("requests_failed", ())] == len(messages_list)
+
+
+def test_successful_requests_report_ok(fake_server):
+    server = fake_server()
+    engine = make_engine(server)
+    results = asyncio.run(
+        engine._run_and_close(
+            engine.alabel([[{"role": "user", "content": "台積電"}]], return_status=True)
+        )
+    )
+    assert [status for _, status in results] == [LABEL_OK]
+    assert "台積電" in results[0][0]